@@ -15,8 +15,10 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import multiprocessing
 from tui.app import MVRtoKuma
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # MVR import process pool in frozen builds
     app = MVRtoKuma()
     app.run()
@@ -26,7 +26,7 @@ from textual.app import App, ComposeResult
 from textual import on, work
 from textual.containers import Horizontal, Vertical, VerticalScroll, Grid
 from textual.widgets import Header, Footer, Input, Button, Static
-from textual.worker import Worker, WorkerState
+from textual.worker import Worker, WorkerState, get_current_worker
 from tui.screens import (
     MVRScreen,
     QuitScreen,
@@ -36,19 +36,26 @@ from tui.screens import (
 )
 from uptime_kuma_api import UptimeKumaApi, MonitorType, UptimeKumaException
 from textual.message import Message
-from tui.fixture import KumaFixture, KumaTag
+from tui.fixture import KumaState
 from textual.reactive import reactive
-from tui.messages import MvrParsed, Errors
+from tui.messages import MvrParsed, MvrChanged, Errors, MergeProgress, MvrMerged
+from tui.watch_mvr import FileWatcher, file_state, fixture_delta
 from tui.read_mvr import get_fixtures
+from tui.fixture_table import FixtureTable
+from tui.mvr_cache import get_cached_fixtures
+from tui.import_mvr import import_files
+from tui.instrument import instrumentation
+from tui.merge_mvr import merger, MergeCancelled
+from tui.network import interface_service
 
 
 class ListDisplay(Vertical):
-    def update_items(self, items: list):
+    def update_items(self, items: list, tag_names=None):
         self.remove_children()
         for item in items:
             tags = ""
-            if hasattr(item, "tags"):
-                tags = ", ".join(item.tags)
+            if tag_names is not None:
+                tags = ", ".join(tag_names(item))
             if self.app.details_toggle:
                 self.mount(
                     Static(
@@ -64,14 +71,13 @@ class ListDisplay(Vertical):
 
 
 class DictListDisplay(Vertical):
-    def update_items(self, items: list):
+    def update_items(self, items: FixtureTable):
         self.remove_children()
-        for item in items:  # layers
-            for fixture in item.fixtures:
-                if self.app.details_toggle:
-                    self.mount(Static(f"[green]{fixture.name}[/green] {fixture.uuid}"))
-                else:
-                    self.mount(Static(f"[green]{fixture.name}[/green]"))
+        for name, uuid in zip(items.name, items.uuid):
+            if self.app.details_toggle:
+                self.mount(Static(f"[green]{name}[/green] {uuid}"))
+            else:
+                self.mount(Static(f"[green]{name}[/green]"))
 
 
 class MonitorsFetched(Message):
@@ -123,27 +129,38 @@ class MVRtoKuma(App):
     timeout: str = "1"
     details_toggle: bool = False
     singleline_ui_toggle: bool = True
-
-    kuma_fixtures = []
-    kuma_tags = []
-    mvr_fixtures = []
-    mvr_classes = []
-    mvr_positions = []
+    low_memory_toggle: bool = False
+    mvr_cache_toggle: bool = True
+    timings_toggle: bool = False
+    discovery_accumulate_toggle: bool = False
+    discovery_export_toggle: bool = True
+    discovery_monitor_interval: int = 5
+    discovery_sweep_networks: str = ""
+    discovery_unicast_toggle: bool = False
+    discovery_poll_chunk: int = 0
+
+    kuma = KumaState()
+    mvr = FixtureTable()
+    watched_file = None
+    watched_uuids = set()
+    merge_running = False
     layers_toggle = True
     classes_toggle = True
     positions_toggle = True
 
+    def update_kuma_display(self):
+        self.kuma_fixtures_display.update_items(
+            self.kuma.monitors.values(), self.kuma.monitor_tag_names
+        )
+        self.kuma_tag_display.update_items(self.kuma.tags.values())
+
     def is_in_classes(self, name):
-        for cl in self.mvr_classes:
-            if cl.name == name:
-                return cl.uuid
-        return None
+        class_ = self.mvr.classes.by_name(name)
+        return class_.uuid if class_ else None
 
     def is_in_positions(self, name):
-        for cl in self.mvr_positions:
-            if cl.name == name:
-                return cl.uuid
-        return None
+        position = self.mvr.positions.by_name(name)
+        return position.uuid if position else None
 
     def compose(self) -> ComposeResult:
         """Create child widgets for the app."""
@@ -190,6 +207,8 @@ class MVRtoKuma(App):
 
     def on_mount(self) -> None:
         """Load the configuration from the JSON file when the app starts."""
+        # enumerate the network interfaces before the discovery is opened
+        interface_service.start()
         if os.path.exists(self.CONFIG_FILE):
             with open(self.CONFIG_FILE, "r") as f:
                 try:
@@ -203,6 +222,26 @@ class MVRtoKuma(App):
                     self.positions_toggle = data.get("positions", False)
                     self.details_toggle = data.get("details_toggle", False)
                     self.singleline_ui_toggle = data.get("singleline_ui_toggle", True)
+                    self.low_memory_toggle = data.get("low_memory_toggle", False)
+                    self.mvr_cache_toggle = data.get("mvr_cache_toggle", True)
+                    self.timings_toggle = data.get("timings_toggle", False)
+                    instrumentation.enabled = self.timings_toggle
+                    self.discovery_accumulate_toggle = data.get(
+                        "discovery_accumulate_toggle", False
+                    )
+                    self.discovery_export_toggle = data.get(
+                        "discovery_export_toggle", True
+                    )
+                    self.discovery_monitor_interval = data.get(
+                        "discovery_monitor_interval", 5
+                    )
+                    self.discovery_sweep_networks = data.get(
+                        "discovery_sweep_networks", ""
+                    )
+                    self.discovery_unicast_toggle = data.get(
+                        "discovery_unicast_toggle", False
+                    )
+                    self.discovery_poll_chunk = data.get("discovery_poll_chunk", 0)
 
                     if self.singleline_ui_toggle:
                         for button in self.query("Button"):
@@ -231,7 +270,6 @@ class MVRtoKuma(App):
             self.disable_buttons()
 
             def set_config(data: dict) -> None:
-                print("setting data", data)
                 if data:
                     self.classes_toggle = data.get("classes", True)
                     self.layers_toggle = data.get("layers", True)
@@ -274,6 +312,9 @@ class MVRtoKuma(App):
                 "timeout": self.timeout,
                 "details_toggle": self.details_toggle,
                 "singleline_ui_toggle": self.singleline_ui_toggle,
+                "low_memory_toggle": self.low_memory_toggle,
+                "mvr_cache_toggle": self.mvr_cache_toggle,
+                "timings_toggle": self.timings_toggle,
             }
 
             def save_config(data: dict) -> None:
@@ -285,21 +326,20 @@ class MVRtoKuma(App):
                     self.timeout = data.get("timeout", "1")
                     self.details_toggle = data.get("details_toggle", False)
                     self.singleline_ui_toggle = data.get("singleline_ui_toggle", True)
+                    self.low_memory_toggle = data.get("low_memory_toggle", False)
+                    self.mvr_cache_toggle = data.get("mvr_cache_toggle", True)
+                    self.timings_toggle = data.get("timings_toggle", False)
+                    instrumentation.enabled = self.timings_toggle
                     self.action_save_config()
                     self.notify("Configuration saved.", timeout=1)
                     self.query_one("#json_output").update(
                         f"{f'Configuration loaded, Server: [blue]{self.url}[/blue]' if self.url else 'Ready... make sure to Configure Uptime Kuma address and credentials'}"
                     )
 
-                    self.mvr_tag_display.update_items(
-                        self.mvr_positions
-                        + self.mvr_classes
-                        + [layer.layer for layer in self.mvr_fixtures]
-                    )
+                    self.mvr_tag_display.update_items(self.mvr.tags())
 
-                    self.mvr_fixtures_display.update_items(self.mvr_fixtures)
-                    self.kuma_fixtures_display.update_items(self.kuma_fixtures)
-                    self.kuma_tag_display.update_items(self.kuma_tags)
+                    self.mvr_fixtures_display.update_items(self.mvr)
+                    self.update_kuma_display()
 
                     if not data.get("singleline_ui_toggle", False):
                         for button in self.query("Button"):
@@ -327,9 +367,38 @@ class MVRtoKuma(App):
 
     @work(thread=True)
     async def run_import_mvr(self, filename) -> str:
+        self.import_mvr(filename)
+
+    def import_mvr(self, filename):
+        """Parse an MVR file and post it as MvrParsed, called from workers."""
         try:
-            mvr_fixtures, mvr_tags = get_fixtures(filename)
-            self.post_message(MvrParsed(fixtures=mvr_fixtures, tags=mvr_tags))
+            parse = functools.partial(get_fixtures, streaming=self.low_memory_toggle)
+            with instrumentation.phase("parse") as phase:
+                if self.mvr_cache_toggle:
+                    mvr_fixtures, mvr_tags = get_cached_fixtures(filename, parse)
+                else:
+                    mvr_fixtures, mvr_tags = parse(filename)
+                phase.items += sum(len(layer.fixtures) for layer in mvr_fixtures)
+            self.post_message(
+                MvrParsed(fixtures=mvr_fixtures, tags=mvr_tags, filename=filename)
+            )
+        except Exception as e:
+            self.post_message(Errors(error=str(e)))
+
+    @work(thread=True)
+    async def run_import_mvr_files(self, filenames) -> str:
+        try:
+            with instrumentation.phase("parse") as phase:
+                for filename, mvr_fixtures, mvr_tags, error in import_files(
+                    filenames,
+                    streaming=self.low_memory_toggle,
+                    use_cache=self.mvr_cache_toggle,
+                ):
+                    if error is not None:
+                        self.post_message(Errors(error=f"{filename}: {error}"))
+                        continue
+                    phase.items += sum(len(layer.fixtures) for layer in mvr_fixtures)
+                    self.post_message(MvrParsed(fixtures=mvr_fixtures, tags=mvr_tags))
         except Exception as e:
             self.post_message(Errors(error=str(e)))
 
@@ -339,11 +408,13 @@ class MVRtoKuma(App):
 
         # formatted = json.dumps(message.monitors, indent=2)
         # output_widget.update(f"[green]Monitors Fetched:[/green]\n{formatted}")
-        self.kuma_fixtures = [KumaFixture(f) for f in message.monitors]
-        # for fixture in self.kuma_fixtures:
-        #    print(fixture)
+        self.kuma.set_monitors(message.monitors)
+        # for monitor in self.kuma.monitors.values():
+        #    print(monitor)
 
-        self.kuma_fixtures_display.update_items(self.kuma_fixtures)
+        self.kuma_fixtures_display.update_items(
+            self.kuma.monitors.values(), self.kuma.monitor_tag_names
+        )
         self.enable_buttons()
 
     def on_tags_fetched(self, message: MonitorsFetched) -> None:
@@ -352,25 +423,61 @@ class MVRtoKuma(App):
 
         # formatted = json.dumps(message.tags, indent=2)
         # output_widget.update(f"[green]Tags Fetched:[/green]\n{formatted}")
-        self.kuma_tag_display.update_items(self.kuma_tags)
+        self.kuma.set_tags(message.tags)
+        self.kuma_tag_display.update_items(self.kuma.tags.values())
         self.enable_buttons()
 
     def on_mvr_parsed(self, message: MvrParsed) -> None:
         # output_widget = self.query_one("#json_output", Static)
         # self.query_one("#get_button", Button).disabled = False
 
-        self.mvr_fixtures += message.fixtures
-        self.mvr_classes += message.tags["classes"]
-        self.mvr_positions += message.tags["positions"]
+        self.mvr.extend(message.fixtures, message.tags)
+        if message.filename is not None and message.filename == self.watched_file:
+            self.watched_uuids = {
+                fixture.uuid
+                for layer in message.fixtures
+                for fixture in layer.fixtures or []
+            }
+
+        self.mvr_tag_display.update_items(self.mvr.tags())
+
+        self.mvr_fixtures_display.update_items(self.mvr)
+        self.query_one("#json_output").update(
+            self.with_timings("[green]MVR data imported[/green]")
+        )
+        self.enable_buttons()
 
-        self.mvr_tag_display.update_items(
-            self.mvr_positions
-            + self.mvr_classes
-            + [layer.layer for layer in self.mvr_fixtures]
+    def on_mvr_changed(self, message: MvrChanged) -> None:
+        mvr = FixtureTable.from_parsed(message.fixtures, message.tags)
+        # only fixtures of the watched file, others came from other imports
+        delta = fixture_delta(self.mvr, mvr, self.watched_uuids)
+        self.mvr.remove({row.uuid for row in delta.removed})
+        self.mvr.extend(message.fixtures, message.tags)
+        self.watched_uuids = set(mvr.index)
+
+        self.mvr_tag_display.update_items(self.mvr.tags())
+        self.mvr_fixtures_display.update_items(self.mvr)
+
+        report = []
+        for label, rows in (
+            ("Added", delta.added),
+            ("Removed", delta.removed),
+            ("Changed", delta.changed),
+        ):
+            if rows:
+                names = ", ".join(row.name for row in rows[:10])
+                more = f" and {len(rows) - 10} more" if len(rows) > 10 else ""
+                report.append(f"[blue]{label} {len(rows)}:[/blue] {names}{more}")
+        if not report:
+            report.append("no fixture changes")
+        self.query_one("#json_output").update(
+            f"[green]MVR file changed[/green] {self.watched_file}\n" + "\n".join(report)
         )
 
-        self.mvr_fixtures_display.update_items(self.mvr_fixtures)
-        self.query_one("#json_output").update("[green]MVR data imported[/green]")
+        if (delta.added or delta.removed or delta.changed) and (
+            self.username and self.password
+        ):
+            self.run_api_sync_delta(delta)
         self.enable_buttons()
 
     def on_errors(self, message: Errors) -> None:
@@ -392,23 +499,26 @@ class MVRtoKuma(App):
         if not api:
             self.post_message(Errors(error="Not logged in"))
             return
-        try:
-            monitors = api.get_monitors()
-            # You can now emit a message or update reactive variables
-            self.post_message(MonitorsFetched(monitors=monitors))
-        except Exception as e:
-            self.post_message(Errors(error=str(e)))
-
-        try:
-            print("get tags")
-            tags = api.get_tags()
-            print("get tags", tags)
-            # You can now emit a message or update reactive variables
-            self.post_message(TagsFetched(tags=tags))
-        except Exception as e:
-            self.post_message(Errors(error=str(e)))
-        finally:
-            api.disconnect()
+        with instrumentation.phase("refresh") as phase:
+            try:
+                phase.api_calls += 1
+                monitors = api.get_monitors()
+                phase.items += len(monitors)
+                # You can now emit a message or update reactive variables
+                self.post_message(MonitorsFetched(monitors=monitors))
+            except Exception as e:
+                self.post_message(Errors(error=str(e)))
+
+            try:
+                phase.api_calls += 1
+                tags = api.get_tags()
+                phase.items += len(tags)
+                # You can now emit a message or update reactive variables
+                self.post_message(TagsFetched(tags=tags))
+            except Exception as e:
+                self.post_message(Errors(error=str(e)))
+            finally:
+                api.disconnect()
 
     @work(thread=True)
     async def run_api_delete_tags(self, mvr=False) -> str:
@@ -425,16 +535,12 @@ class MVRtoKuma(App):
             self.post_message(Errors(error="Not logged in"))
             return
         try:
-            for tag in self.kuma_tags:
+            # class, position or layer names
+            mvr_tag_names = {mvr_tag.name for mvr_tag in self.mvr.tags()}
+            for tag in list(self.kuma.tags.values()):
                 delete = False
                 if mvr:
-                    for mvr_tag in (
-                        self.mvr_classes
-                        + self.mvr_positions
-                        + [layer.layer for layer in self.mvr_fixtures]
-                    ):  # class or layer
-                        if tag.name == mvr_tag.name:
-                            delete = True
+                    delete = tag.name in mvr_tag_names
                 else:
                     delete = True
                 if delete:
@@ -463,13 +569,10 @@ class MVRtoKuma(App):
             self.post_message(Errors(error="Not logged in"))
             return
         try:
-            for monitor in self.kuma_fixtures:
+            for monitor in list(self.kuma.monitors.values()):
                 delete = False
                 if mvr:
-                    for layer in self.mvr_fixtures:
-                        for fixture in layer.fixtures:
-                            if fixture.uuid == monitor.uuid:
-                                delete = True
+                    delete = monitor.uuid in self.mvr
                 else:
                     delete = True
                 if delete:
@@ -502,107 +605,33 @@ class MVRtoKuma(App):
             self.post_message(Errors(error="Not logged in"))
             return
         try:
-            for layer in self.mvr_fixtures:
-                print("debug layer", layer)
-
-                for mvr_fixture in layer.fixtures or []:
-                    url = None
-                    for network in mvr_fixture.addresses.network:
-                        if network.ipv4 is not None:
-                            url = network.ipv4
-                            break
-                    if url is None:
-                        continue
-
-                    monitor_id = None
-                    monitor_tags = []
-                    add_monitor = True
-                    add_tag = None
-                    for kuma_fixture in self.kuma_fixtures:
-                        # print(f"{kuma_fixture.name=} {mvr_fixture=}")
-                        if mvr_fixture.uuid == kuma_fixture.uuid:
-                            add_monitor = False
-                            monitor_id = kuma_fixture.id
-                            monitor_tags = kuma_fixture.tags
-                            print("Monitor already exists", monitor_id, monitor_tags)
-                            break
-                    if add_monitor:
-                        print("Add new monitor")
+            for mvr_fixture in self.mvr.rows():
+                url = mvr_fixture.ipv4
+                if url is None:
+                    continue
+
+                monitor_id = None
+                kuma_monitor = self.kuma.monitor(mvr_fixture.uuid)
+                if kuma_monitor is None:
+                    with instrumentation.phase("monitor create") as phase:
+                        phase.api_calls += 1
                         result = api.add_monitor(
                             type=MonitorType.HTTP,
                             name=mvr_fixture.name,
                             url=f"http://{url}",
                             description=mvr_fixture.uuid,
                         )
+                        phase.items += 1
 
-                        monitor_id = result.get("monitorID", None)
+                    monitor_id = result.get("monitorID", None)
                     if monitor_id is not None:
-                        for kuma_tag in self.kuma_tags:
-                            if self.layers_toggle:  # add layers tag
-                                if kuma_tag.name == layer.layer.name:
-                                    if kuma_tag.name not in monitor_tags:
-                                        print(
-                                            f"{monitor_id=}, {kuma_tag.id=}, {kuma_tag.name=}, {monitor_tags=}"
-                                        )
-                                        monitor_tags.append(kuma_tag.name)
-                                        add_tag = kuma_tag.id
-
-                                if add_tag:
-                                    try:
-                                        print("add layer", kuma_tag.name)
-                                        api.add_monitor_tag(
-                                            monitor_id=monitor_id,
-                                            tag_id=kuma_tag.id,
-                                        )
-                                        add_tag = None
-                                    except Exception as e:
-                                        print(e)
-
-                        add_tag = None
-                        for kuma_tag in self.kuma_tags:
-                            if self.positions_toggle:
-                                uuid = self.is_in_positions(kuma_tag.name)
-                                if uuid == mvr_fixture.position:
-                                    if kuma_tag.name not in monitor_tags:
-                                        print(
-                                            f"{monitor_id=}, {kuma_tag.id=}, {kuma_tag.name=}, {monitor_tags=}"
-                                        )
-                                        monitor_tags.append(kuma_tag.name)
-                                        add_tag = kuma_tag.id
-
-                                if add_tag:
-                                    try:
-                                        print("add position", kuma_tag.name)
-                                        api.add_monitor_tag(
-                                            monitor_id=monitor_id,
-                                            tag_id=kuma_tag.id,
-                                        )
-                                        add_tag = None
-                                    except Exception as e:
-                                        print(e)
-
-                        add_tag = None
-                        for kuma_tag in self.kuma_tags:
-                            if self.classes_toggle:
-                                uuid = self.is_in_classes(kuma_tag.name)
-                                if uuid == mvr_fixture.classing:
-                                    if kuma_tag.name not in monitor_tags:
-                                        print(
-                                            f"{monitor_id=}, {kuma_tag.id=}, {kuma_tag.name=}, {monitor_tags=}"
-                                        )
-                                        monitor_tags.append(kuma_tag.name)
-                                        add_tag = kuma_tag.id
-
-                                if add_tag:
-                                    try:
-                                        print("add class", kuma_tag.name)
-                                        api.add_monitor_tag(
-                                            monitor_id=monitor_id,
-                                            tag_id=kuma_tag.id,
-                                        )
-                                        add_tag = None
-                                    except Exception as e:
-                                        print(e)
+                        self.kuma.add_monitor(
+                            monitor_id, mvr_fixture.name, mvr_fixture.uuid
+                        )
+                else:
+                    monitor_id = kuma_monitor.id
+                if monitor_id is not None:
+                    self.add_monitor_tags(api, monitor_id, mvr_fixture)
 
         except Exception as e:
             traceback.print_exception(e)
@@ -612,6 +641,225 @@ class MVRtoKuma(App):
             if api:
                 api.disconnect()
 
+    def fixture_tag_names(self, mvr_fixture):
+        """Names of the enabled layer, position and class tags of a fixture."""
+        names = []
+        if self.layers_toggle and mvr_fixture.layer:
+            names.append(mvr_fixture.layer.name)
+        if self.positions_toggle:
+            names.append(self.mvr.positions.name_of(mvr_fixture.position))
+        if self.classes_toggle:
+            names.append(self.mvr.classes.name_of(mvr_fixture.classing))
+        return names
+
+    def remove_stale_monitor_tags(self, api, monitor_id, mvr_fixture):
+        """Detach the MVR tags a moved fixture no longer has, keep other tags."""
+        mvr_names = set()
+        for enabled, column in (
+            (self.layers_toggle, self.mvr.layers),
+            (self.positions_toggle, self.mvr.positions),
+            (self.classes_toggle, self.mvr.classes),
+        ):
+            if enabled:
+                mvr_names.update(tag.name for tag in column)
+        wanted = set(self.fixture_tag_names(mvr_fixture))
+        with instrumentation.phase("tag detach") as phase:
+            for tag_id in list(self.kuma.monitor_tags.get(monitor_id, ())):
+                kuma_tag = self.kuma.tags.get(tag_id)
+                if (
+                    kuma_tag is None
+                    or kuma_tag.name not in mvr_names
+                    or kuma_tag.name in wanted
+                ):
+                    continue
+                try:
+                    phase.api_calls += 1
+                    api.delete_monitor_tag(tag_id=tag_id, monitor_id=monitor_id)
+                    phase.items += 1
+                    self.kuma.detach(monitor_id, tag_id)
+                except Exception as e:
+                    print(e)
+
+    def add_monitor_tags(self, api, monitor_id, mvr_fixture):
+        """Attach layer, position and class tags to a monitor."""
+        with instrumentation.phase("tag attach") as phase:
+            for name in self.fixture_tag_names(mvr_fixture):
+                kuma_tag = self.kuma.tag(name)
+                if kuma_tag is None or self.kuma.has_tag(monitor_id, kuma_tag.id):
+                    continue
+                try:
+                    phase.api_calls += 1
+                    api.add_monitor_tag(
+                        monitor_id=monitor_id,
+                        tag_id=kuma_tag.id,
+                    )
+                    phase.items += 1
+                    self.kuma.attach(monitor_id, kuma_tag.id)
+                except Exception as e:
+                    print(e)
+
+    def create_missing_tags(self, api):
+        with instrumentation.phase("tag create") as phase:
+            for tag in self.mvr.tags():
+                if self.kuma.tag(tag.name) is None:
+                    phase.api_calls += 1
+                    api.add_tag(
+                        name=tag.name,
+                        color="#{:06x}".format(random.randint(0, 0xFFFFFF)),
+                    )
+                    phase.items += 1
+
+    @work(thread=True)
+    async def run_api_sync_delta(self, delta) -> str:
+        """Push a watched MVR file change to Uptime Kuma."""
+        api = None
+        try:
+            api = UptimeKumaApi(self.url, timeout=int(self.timeout))
+            api.login(self.username, self.password)
+        except Exception as e:
+            traceback.print_exception(e)
+            self.post_message(Errors(error=str(e)))
+
+        if not api:
+            self.post_message(Errors(error="Not logged in"))
+            return
+        try:
+            self.kuma = KumaState(tags=api.get_tags())
+            self.create_missing_tags(api)
+            self.kuma = KumaState.from_api(api)
+
+            for mvr_fixture in delta.removed:
+                kuma_monitor = self.kuma.monitor(mvr_fixture.uuid)
+                if kuma_monitor is not None:
+                    api.delete_monitor(kuma_monitor.id)
+
+            for mvr_fixture in delta.changed + delta.added:
+                url = mvr_fixture.ipv4
+                kuma_monitor = self.kuma.monitor(mvr_fixture.uuid)
+                if url is None:
+                    if kuma_monitor is not None:
+                        api.delete_monitor(kuma_monitor.id)
+                    continue
+                if kuma_monitor is None:
+                    with instrumentation.phase("monitor create") as phase:
+                        phase.api_calls += 1
+                        result = api.add_monitor(
+                            type=MonitorType.HTTP,
+                            name=mvr_fixture.name,
+                            url=f"http://{url}",
+                            description=mvr_fixture.uuid,
+                        )
+                        phase.items += 1
+                    monitor_id = result.get("monitorID", None)
+                    if monitor_id is not None:
+                        self.kuma.add_monitor(
+                            monitor_id, mvr_fixture.name, mvr_fixture.uuid
+                        )
+                else:
+                    api.edit_monitor(
+                        kuma_monitor.id, name=mvr_fixture.name, url=f"http://{url}"
+                    )
+                    monitor_id = kuma_monitor.id
+                    # the fixture may have moved to another layer, class or position
+                    self.remove_stale_monitor_tags(api, monitor_id, mvr_fixture)
+                if monitor_id is not None:
+                    self.add_monitor_tags(api, monitor_id, mvr_fixture)
+        except Exception as e:
+            traceback.print_exception(e)
+            self.post_message(Errors(error=str(e)))
+        finally:
+            api.disconnect()
+
+    @work(thread=True, exclusive=True, group="watch_mvr")
+    async def run_watch_mvr(self, filename) -> str:
+        worker = get_current_worker()
+        # import first, in this worker, so the watcher starts from the version
+        # read and a change is never handled before the import
+        last_stat = file_state(filename)
+        self.import_mvr(filename)
+        watcher = FileWatcher(filename, worker=worker, last_stat=last_stat)
+        try:
+            while not worker.is_cancelled:
+                if not watcher.wait(1.0):
+                    continue
+                try:
+                    with instrumentation.phase("parse") as phase:
+                        mvr_fixtures, mvr_tags = get_fixtures(
+                            filename, streaming=self.low_memory_toggle
+                        )
+                        phase.items += sum(
+                            len(layer.fixtures) for layer in mvr_fixtures
+                        )
+                    self.post_message(MvrChanged(fixtures=mvr_fixtures, tags=mvr_tags))
+                except Exception as e:
+                    # the exporter may still be busy, next change retries
+                    self.post_message(Errors(error=str(e)))
+        finally:
+            watcher.close()
+
+    def start_watch(self, filename):
+        self.stop_watch()
+        self.clean_mvr_data()
+        self.watched_file = filename
+        self.run_watch_mvr(filename)
+
+    def stop_watch(self):
+        self.workers.cancel_group(self, "watch_mvr")
+        self.watched_file = None
+        self.watched_uuids = set()
+
+    def clean_mvr_data(self):
+        self.mvr = FixtureTable()
+        self.watched_uuids = set()
+
+        self.mvr_tag_display.update_items(self.mvr.tags())
+        self.mvr_fixtures_display.update_items(self.mvr)
+
+    @work(thread=True, exclusive=True, group="merge_mvr")
+    async def run_merge_mvr(self, sources, target, precedence) -> str:
+        worker = get_current_worker()
+        try:
+            with instrumentation.phase("merge") as phase:
+                stats = merger(
+                    sources,
+                    target,
+                    precedence=precedence,
+                    progress=lambda text: self.post_message(MergeProgress(text=text)),
+                    is_cancelled=lambda: worker.is_cancelled,
+                )
+                phase.items += stats.by_uuid + stats.by_dmx
+            self.post_message(MvrMerged(stats=stats))
+        except MergeCancelled:
+            self.post_message(MergeProgress(text="[yellow]Merge cancelled[/yellow]"))
+        except Exception as e:
+            self.post_message(Errors(error=str(e)))
+
+    def start_merge(self, sources, target, precedence):
+        self.merge_running = True
+        self.query_one("#json_output").update("Merging MVR files...")
+        self.run_merge_mvr(sources, target, precedence)
+
+    def cancel_merge(self):
+        self.workers.cancel_group(self, "merge_mvr")
+        self.merge_running = False
+
+    def on_merge_progress(self, message: MergeProgress) -> None:
+        self.query_one("#json_output").update(message.text)
+
+    def on_mvr_merged(self, message: MvrMerged) -> None:
+        stats = message.stats
+        result = (
+            f"[green]Done! Saved as `{stats.output_path}`[/green]\n"
+            f"Matched by UUID: {stats.by_uuid}, by DMX address: "
+            f"{stats.by_dmx}, unmatched: {stats.unmatched}"
+        )
+        if stats.conflicts:
+            result += (
+                f"\n[yellow]{len(stats.conflicts)} conflict(s), "
+                f"see `{stats.report_path}`[/yellow]"
+            )
+        self.query_one("#json_output").update(self.with_timings(result))
+
     @work(thread=True)
     async def run_api_create_tags(self) -> str:
         # Safe to call blocking code here
@@ -627,21 +875,7 @@ class MVRtoKuma(App):
             self.post_message(Errors(error="Not logged in"))
             return
         try:
-            for tag in (
-                self.mvr_classes
-                + self.mvr_positions
-                + [layer.layer for layer in self.mvr_fixtures]
-            ):
-                add = True
-                for kuma_tag in self.kuma_tags:
-                    print(f"{kuma_tag.name=} {tag=}")
-                    if tag.name == kuma_tag.name or tag.uuid == kuma_tag.uuid:
-                        add = False
-                if add:
-                    api.add_tag(
-                        name=tag.name,
-                        color="#{:06x}".format(random.randint(0, 0xFFFFFF)),
-                    )
+            self.create_missing_tags(api)
         except Exception as e:
             print("error!!!!!", traceback.print_exception(e))
             self.post_message(Errors(error=str(e)))
@@ -661,6 +895,15 @@ class MVRtoKuma(App):
             "positions": self.positions_toggle,
             "details_toggle": self.details_toggle,
             "singleline_ui_toggle": self.singleline_ui_toggle,
+            "low_memory_toggle": self.low_memory_toggle,
+            "mvr_cache_toggle": self.mvr_cache_toggle,
+            "timings_toggle": self.timings_toggle,
+            "discovery_accumulate_toggle": self.discovery_accumulate_toggle,
+            "discovery_export_toggle": self.discovery_export_toggle,
+            "discovery_monitor_interval": self.discovery_monitor_interval,
+            "discovery_sweep_networks": self.discovery_sweep_networks,
+            "discovery_unicast_toggle": self.discovery_unicast_toggle,
+            "discovery_poll_chunk": self.discovery_poll_chunk,
         }
         with open(self.CONFIG_FILE, "w") as f:
             json.dump(data, f, indent=4)
@@ -677,15 +920,32 @@ class MVRtoKuma(App):
             "run_api_create_tags",
             "run_api_create_monitors",
             "run_api_delete_monitors",
+            "run_api_sync_delta",
         ]:
             if event.worker.is_finished:
                 self.run_api_get_data()
 
+        if event.worker.name == "run_merge_mvr":
+            if event.worker.is_finished:
+                self.merge_running = False
+
         if event.worker.name == "run_api_get_data":
             if event.worker.is_finished:
-                self.query_one("#json_output").update("Server data refreshed")
+                self.query_one("#json_output").update(
+                    self.with_timings("Server data refreshed")
+                )
                 self.enable_buttons()
 
+    def with_timings(self, text):
+        """Append the timing summary to a status text, dump it as JSON."""
+        if not instrumentation.enabled or not instrumentation.phases:
+            return text
+        try:
+            instrumentation.dump()
+        except OSError as e:
+            return f"{text}\n[red]Error:[/red] {e}"
+        return f"{text}\n[blue]Timings:[/blue]\n{instrumentation.summary()}"
+
     def disable_buttons(self):
         self.query_one("#get_button").disabled = True
         self.query_one("#open_create_monitors").disabled = True
@@ -694,7 +954,7 @@ class MVRtoKuma(App):
     def enable_buttons(self):
         if self.username and self.password:
             self.query_one("#get_button").disabled = False
-            if self.mvr_fixtures:
+            if self.mvr:
                 self.query_one("#open_create_monitors").disabled = False
             self.query_one("#delete_screen").disabled = False
         else:
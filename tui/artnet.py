@@ -15,95 +15,380 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
+import ipaddress
+import os
 import socket
 import struct
-import time
+from types import SimpleNamespace
 
 
 ARTNET_PORT = 6454
+QUIET_TIME = 0.3
+SWEEP_RATE = 10000  # unicast ArtPolls per second
+CHUNK_SPACING = 0.02  # between targeted ArtPolls, spreads out the replies
+RECEIVE_BUFFER = 4 * 1024 * 1024
+ARTNET_ID = b"Art-Net\x00"
+OP_POLL = b"\x00\x20"  # 0x2000, little endian
+OP_POLL_REPLY = 0x2100
+PROTOCOL_VERSION = 14
+TALK_TO_ME = 0x01
+TARGETED_MODE = 0x20
+MAX_PORT_ADDRESS = 0x7FFF
+POLL_CHUNKS = {
+    0: "Poll all nodes at once",
+    8192: "Targeted polls, 8192 universes at a time",
+    2048: "Targeted polls, 2048 universes at a time",
+    512: "Targeted polls, 512 universes at a time",
+}
+# ID, OpCode, ProtVer, Flags, DiagPriority
+ARTPOLL = struct.Struct(">8s2sHBB")
+# Art-Net 4 adds TargetPortAddressTop/Bottom, EstaMan and Oem
+ARTPOLL_TARGETED = struct.Struct(">8s2sHBBHHHH")
+# ArtPollReply up to SwOut, multi byte fields are big endian unless split:
+# ID, OpCode, IP, Port (little endian), VersInfo, NetSwitch, SubSwitch, Oem,
+# Ubea, Status1, EstaManLo, EstaManHi, ShortName, LongName, NodeReport,
+# NumPorts, PortTypes, GoodInput, GoodOutputA, SwIn, SwOut
+POLL_REPLY = struct.Struct(">8s2s4s2sHBBHBBBB18s64s64sH4s4s4s4s4s")
+# Style, MAC, BindIp, BindIndex, Status2, after three spare bytes
+POLL_REPLY_EXTENSION = struct.Struct(">B6s4sBB")
+POLL_REPLY_EXTENSION_OFFSET = 200
+POLL_REPLY_SIZE = POLL_REPLY_EXTENSION_OFFSET + POLL_REPLY_EXTENSION.size
+PORT_OUTPUT = 0x80
+PORT_INPUT = 0x40
+
+
+class _ReplyProtocol(asyncio.DatagramProtocol):
+    """Pass the datagrams of one interface socket to ArtNetDiscovery."""
+
+    def __init__(self, discovery, interface):
+        self.discovery = discovery
+        self.interface = interface
+        self.sent = None  # loop time of the ArtPoll
+
+    def datagram_received(self, data, addr):
+        self.discovery._reply_received(data, addr, self)
+
+    def error_received(self, exc):
+        # ICMP port unreachable of polled hosts which are not Art-Net nodes
+        if not isinstance(exc, ConnectionRefusedError):
+            print(exc)
 
 
 class ArtNetDiscovery:
     def __init__(
         self,
         bind_ip: str = None,
+        interfaces=None,
     ):
+        """Discovery on one socket bound to bind_ip, or on one socket per
+        interface, interfaces being records with name, ip and broadcast as
+        returned by get_interfaces."""
         self.bind_ip = bind_ip or "0.0.0.0"
-        self.socket = None
+        self.interfaces = interfaces or [
+            SimpleNamespace(name=None, ip=self.bind_ip, broadcast="<broadcast>")
+        ]
+        self.sockets = []
+        self.devices = {}
+        self.new_device = None
+        self.loop = None
+        self.sent = {}  # loop time of the unicast polls, by target
+        self.chunk = 0
+        self.chunk_sent = {}  # loop time of the targeted polls, by chunk
+        self.stats = None
 
     def start(self):
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        for interface in self.interfaces:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            try:
+                # room for the replies of many nodes arriving at once
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+            except OSError:
+                pass
 
-        try:
-            self.socket.bind((self.bind_ip, ARTNET_PORT))
-        except Exception as e:
-            print(e)
+            try:
+                sock.bind((interface.ip, ARTNET_PORT))
+            except Exception as e:
+                print(e)
+                sock.close()
+                continue
+            self.sockets.append((interface, sock))
 
     def stop(self):
-        if self.socket:
-            self.socket.close()
+        for _, sock in self.sockets:
+            sock.close()
+        self.sockets = []
 
-    def discover_devices(self, timeout: float = 1.5):
-        artpoll = self._create_artpoll_packet()
+    def _reply_received(self, data, addr, protocol):
+        self.stats.received += 1
+        if not self._is_artpoll_reply(data):
+            return
+        device = self._parse_artpoll_reply(data, addr)
+        if device is None:
+            return
+        self.stats.parsed += 1
+        # every bind index of a multi-port node replies separately
+        key = (device["reported_ip"], device["bind_index"])
+        if key in self.devices:
+            self.stats.duplicate += 1
+            return
+        device["interface"] = protocol.interface.name
+        device["interface_ip"] = protocol.interface.ip
+        sent = self.sent.get(addr[0])
+        ports = device["inputs"] + device["outputs"]
+        if sent is None and self.chunk_sent and ports:
+            # answered first the poll of the chunk with its lowest port
+            sent = self.chunk_sent.get(min(ports) // self.chunk)
+        device["latency"] = self.loop.time() - (sent or protocol.sent)
+        self.devices[key] = device
+        self.new_device.set()
+
+    async def discover(
+        self,
+        timeout: float = 1.5,
+        quiet: float = QUIET_TIME,
+        targets=None,
+        rate: int = SWEEP_RATE,
+        chunk: int = 0,
+    ):
+        """Send ArtPolls and collect the replies on the running loop.
+
+        Without targets, the poll goes to the directed broadcast of every
+        interface. With chunk, targeted ArtPolls walk the Port-Address space
+        chunk universes at a time, so only the nodes with ports in the chunk
+        reply at once. The chunk polls go out CHUNK_SPACING apart, replies
+        are collected meanwhile. targets are IPv4 addresses polled one by
+        one, at most rate polls per second, from the interface on the same
+        network or from the first one. Replies of all sockets are handled by
+        the same loop while polling. After the last poll and the first
+        reply, discovery finishes as soon as no new device replied for quiet
+        seconds, at the latest after timeout seconds. The counters of the
+        run are kept in self.stats.
+        """
+        loop = self.loop = asyncio.get_running_loop()
+        self.devices = {}
+        self.sent = {}
+        self.chunk = chunk
+        self.chunk_sent = {}
+        self.stats = SimpleNamespace(
+            polls=0, received=0, parsed=0, duplicate=0, dropped=None
+        )
+        self.new_device = asyncio.Event()
+        endpoints = []
+        try:
+            for interface, sock in self.sockets:
+                sock.setblocking(False)
+                # the transport owns the socket from now on and closes it
+                transport, protocol = await loop.create_datagram_endpoint(
+                    lambda interface=interface: _ReplyProtocol(self, interface),
+                    sock=sock,
+                )
+                endpoints.append((interface, transport, protocol))
+            self.sockets = []
+            if not endpoints:
+                return []
+            if targets is not None:
+                await self._poll_targets(endpoints, targets, rate)
+                await self._collect(timeout, quiet)
+            elif chunk:
+                for bottom in range(0, MAX_PORT_ADDRESS + 1, chunk):
+                    if bottom:
+                        # replies of the previous chunks arrive meanwhile
+                        await asyncio.sleep(CHUNK_SPACING)
+                    top = min(bottom + chunk - 1, MAX_PORT_ADDRESS)
+                    self.chunk_sent[bottom // chunk] = self.loop.time()
+                    self._poll_broadcast(
+                        endpoints, self._create_artpoll_packet((bottom, top))
+                    )
+                await self._collect(timeout, quiet)
+            else:
+                self._poll_broadcast(endpoints, self._create_artpoll_packet())
+                await self._collect(timeout, quiet)
+        finally:
+            for _, transport, _ in endpoints:
+                dropped = _socket_drops(transport.get_extra_info("socket"))
+                if dropped is not None:
+                    self.stats.dropped = (self.stats.dropped or 0) + dropped
+                transport.close()
+        return list(self.devices.values())
 
-        self.socket.sendto(artpoll, ("<broadcast>", ARTNET_PORT))
+    def _poll_broadcast(self, endpoints, artpoll):
+        for interface, transport, protocol in endpoints:
+            protocol.sent = self.loop.time()
+            transport.sendto(artpoll, (interface.broadcast, ARTNET_PORT))
+            self.stats.polls += 1
 
-        devices = {}
-        start_time = time.time()
+    async def _collect(self, timeout, quiet):
+        """Wait for replies until quiet, at the latest for timeout seconds.
 
-        while time.time() - start_time < timeout:
+        The quiet time only counts after the first device.
+        """
+        deadline = self.loop.time() + timeout
+        while (remaining := deadline - self.loop.time()) > 0:
+            if self.devices:
+                remaining = min(remaining, quiet)
+            self.new_device.clear()
             try:
-                self.socket.settimeout(0.1)
-                data, addr = self.socket.recvfrom(1024)
+                await asyncio.wait_for(self.new_device.wait(), remaining)
+            except asyncio.TimeoutError:
+                break
 
-                if self._is_artpoll_reply(data):
-                    device = self._parse_artpoll_reply(data, addr)
-                    if device:
-                        if device["reported_ip"] not in devices:
-                            devices[device["reported_ip"]] = device
-
-            except socket.timeout:
-                continue
-            except Exception as e:
-                print(e)
+    async def _poll_targets(self, endpoints, targets, rate):
+        artpoll = self._create_artpoll_packet()
+        networks = [
+            (
+                ipaddress.IPv4Network(f"{interface.ip}/{interface.prefix}", False),
+                transport,
+            )
+            for interface, transport, _ in endpoints
+            if getattr(interface, "prefix", None)
+        ]
+        default = endpoints[0][1]
+        for _, _, protocol in endpoints:
+            protocol.sent = self.loop.time()
+        # send in small batches, sleeping until the next one is due
+        batch = max(1, rate // 100)
+        start = self.loop.time()
+        for count, target in enumerate(targets, 1):
+            transport = default
+            if networks:
+                address = ipaddress.IPv4Address(target)
+                for network, network_transport in networks:
+                    if address in network:
+                        transport = network_transport
+                        break
+            self.sent[target] = self.loop.time()
+            transport.sendto(artpoll, (target, ARTNET_PORT))
+            self.stats.polls += 1
+            if count % batch == 0:
+                await asyncio.sleep(max(0, start + count / rate - self.loop.time()))
 
-        device_list = list(devices.values())
-        return device_list
+    def discover_devices(self, timeout: float = 1.5, quiet: float = QUIET_TIME):
+        """Blocking variant of discover, for use outside of an event loop."""
+        return asyncio.run(self.discover(timeout, quiet))
 
-    def _create_artpoll_packet(self):
-        packet = b"Art-Net\x00"  # ID
-        packet += struct.pack("<H", 0x2000)  # OpCode (ArtPoll)
-        packet += struct.pack(">H", 14)  # Protocol version
-        packet += b"\x01"  # TalkToMe
-        packet += b"\x00"  # Priority
-        return packet
+    def _create_artpoll_packet(self, target=None):
+        """ArtPoll, targeted to the (bottom, top) Port-Address range if given."""
+        if target is None:
+            return ARTPOLL.pack(ARTNET_ID, OP_POLL, PROTOCOL_VERSION, TALK_TO_ME, 0)
+        bottom, top = target
+        return ARTPOLL_TARGETED.pack(
+            ARTNET_ID,
+            OP_POLL,
+            PROTOCOL_VERSION,
+            TALK_TO_ME | TARGETED_MODE,
+            0,  # DiagPriority
+            top,
+            bottom,
+            0,  # EstaMan
+            0,  # Oem
+        )
 
     def _is_artpoll_reply(self, data: bytes):
         return (
             len(data) >= 10
-            and data.startswith(b"Art-Net\x00")
-            and struct.unpack("<H", data[8:10])[0] == 0x2100
+            and data.startswith(ARTNET_ID)
+            and struct.unpack_from("<H", data, 8)[0] == OP_POLL_REPLY
         )
 
     def _parse_artpoll_reply(self, data: bytes, addr: tuple):
-        """Parse ArtPollReply packet."""
-        try:
-            ip_bytes = data[10:14]
-            reported_ip = f"{ip_bytes[0]}.{ip_bytes[1]}.{ip_bytes[2]}.{ip_bytes[3]}"
-            short_name = data[26:43].decode("ascii", errors="ignore").strip("\x00")
-            long_name = data[44:171].decode("ascii", errors="ignore").strip("\x00")
-
-            return {
-                "reported_ip": reported_ip,
-                "source_ip": addr[0],
-                "short_name": short_name,
-                "long_name": long_name,
-            }
-        except Exception as e:
-            print(f"Error parsing ArtPollReply: {e}")
-            return None
+        """Parse ArtPollReply packet.
+
+        Universes are 15 bit Port-Addresses, built from the Net and Sub-Net
+        switches and the SwIn/SwOut of every input and output port.
+        """
+        if len(data) < POLL_REPLY_SIZE:
+            # older nodes send shorter replies, missing fields are zero
+            data = bytes(data).ljust(POLL_REPLY_SIZE, b"\x00")
+        view = memoryview(data)
+        (
+            _,
+            _,
+            ip,
+            port,
+            version,
+            net,
+            subnet,
+            oem,
+            ubea,
+            status1,
+            esta_lo,
+            esta_hi,
+            short_name,
+            long_name,
+            node_report,
+            num_ports,
+            port_types,
+            good_input,
+            good_output,
+            sw_in,
+            sw_out,
+        ) = POLL_REPLY.unpack_from(view)
+        style, mac, bind_ip, bind_index, status2 = POLL_REPLY_EXTENSION.unpack_from(
+            view, POLL_REPLY_EXTENSION_OFFSET
+        )
+        port_address = ((net & 0x7F) << 8) | ((subnet & 0x0F) << 4)
+        ports = min(num_ports, 4)
+        return {
+            "reported_ip": socket.inet_ntoa(ip),
+            "source_ip": addr[0],
+            "port": int.from_bytes(port, "little"),
+            "short_name": _string(short_name),
+            "long_name": _string(long_name),
+            "node_report": _string(node_report),
+            "version": version,
+            "net": net,
+            "subnet": subnet,
+            "oem": oem,
+            "esta": (esta_hi << 8) | esta_lo,
+            "ubea": ubea,
+            "status1": status1,
+            "status2": status2,
+            "style": style,
+            "num_ports": num_ports,
+            "port_types": tuple(port_types[:ports]),
+            "good_input": tuple(good_input[:ports]),
+            "good_output": tuple(good_output[:ports]),
+            "inputs": [
+                port_address | (sw_in[i] & 0x0F)
+                for i in range(ports)
+                if port_types[i] & PORT_INPUT
+            ],
+            "outputs": [
+                port_address | (sw_out[i] & 0x0F)
+                for i in range(ports)
+                if port_types[i] & PORT_OUTPUT
+            ],
+            "mac": ":".join(f"{byte:02x}" for byte in mac) if any(mac) else None,
+            "bind_ip": socket.inet_ntoa(bind_ip) if any(bind_ip) else None,
+            # 0 and 1 both mean the root device
+            "bind_index": max(bind_index, 1),
+        }
+
+
+def _socket_drops(sock):
+    """Datagrams the kernel dropped for a full receive buffer of sock.
+
+    Read from /proc/net/udp, None where it is not available.
+    """
+    try:
+        inode = os.fstat(sock.fileno()).st_ino
+        with open("/proc/net/udp") as f:
+            next(f)
+            for line in f:
+                fields = line.split()
+                if int(fields[9]) == inode:
+                    return int(fields[12])
+    except (OSError, ValueError, IndexError, StopIteration):
+        return None
+    return None
+
+
+def _string(field: bytes):
+    """A null terminated ASCII field of the reply."""
+    return field.split(b"\x00", 1)[0].decode("ascii", errors="ignore")
 
 
 def main():
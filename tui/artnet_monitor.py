@@ -0,0 +1,82 @@
+# Copyright (C) 2025 vanous
+#
+# This file is part of MVRtoKuma.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from types import SimpleNamespace
+import time
+
+MONITOR_INTERVALS = (1, 2, 5, 10, 30)
+GONE_AFTER = 3
+# a change of these is reported, the node report text changes on every poll
+STATUS_FIELDS = ("status1", "status2", "good_input", "good_output")
+
+
+class ArtNetMonitor:
+    """Live table of the devices answering the periodic ArtPolls.
+
+    update() compares the replies of one poll with the table and returns
+    only what changed: devices which appeared, devices gone after missing
+    gone_after polls in a row and devices with changed status bits. All
+    devices answering the poll are listed in seen, for their last seen time
+    and latency.
+    """
+
+    def __init__(self, gone_after: int = GONE_AFTER):
+        self.gone_after = gone_after
+        self.devices = {}
+        self.polls = 0
+
+    def online(self):
+        return sum(device.online for device in self.devices.values())
+
+    def update(self, replies, now=None):
+        now = now or time.time()
+        self.polls += 1
+        delta = SimpleNamespace(appeared=[], gone=[], changed=[], seen=[])
+        seen = set()
+        for reply in replies:
+            key = (reply["reported_ip"], reply["bind_index"])
+            seen.add(key)
+            status = tuple(reply.get(field) for field in STATUS_FIELDS)
+            device = self.devices.get(key)
+            if device is None:
+                device = self.devices[key] = SimpleNamespace(
+                    key=key,
+                    ip_address=reply["source_ip"],
+                    bind_index=reply["bind_index"],
+                    short_name=reply["short_name"],
+                    interface=reply.get("interface"),
+                    status=status,
+                    online=False,
+                )
+            if not device.online:
+                device.online = True
+                delta.appeared.append(device)
+            elif device.status != status:
+                delta.changed.append(device)
+            device.status = status
+            device.last_seen = now
+            device.latency = reply.get("latency")
+            device.missed = 0
+            delta.seen.append(device)
+
+        for key, device in self.devices.items():
+            if device.online and key not in seen:
+                device.missed += 1
+                if device.missed >= self.gone_after:
+                    device.online = False
+                    delta.gone.append(device)
+        return delta
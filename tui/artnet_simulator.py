@@ -0,0 +1,341 @@
+# Copyright (C) 2025 vanous
+#
+# This file is part of MVRtoKuma.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Virtual Art-Net nodes answering ArtPoll, and a discovery benchmark.
+
+Serve simulated nodes, for example for a discovery run from the app:
+    python -m tui.artnet_simulator serve --nodes 2000 --ports 8 --host 127.0.0.2
+
+Measure discovery completeness and time-to-complete:
+    python -m tui.artnet_simulator benchmark --counts 100,1000,5000
+
+On loopback the simulator listens on 127.0.0.2 and discovery on 127.0.0.1,
+both on the Art-Net port. Linux answers the whole 127.0.0.0/8, on macOS add
+the address first with `ifconfig lo0 alias 127.0.0.2`. Run it in a network
+namespace or on another host to simulate a real network.
+"""
+
+from types import SimpleNamespace
+import argparse
+import asyncio
+import ipaddress
+import random
+import socket
+import struct
+import time
+from tui.artnet import (
+    ArtNetDiscovery,
+    ARTNET_ID,
+    ARTNET_PORT,
+    MAX_PORT_ADDRESS,
+    OP_POLL,
+    OP_POLL_REPLY,
+    POLL_REPLY,
+    POLL_REPLY_EXTENSION,
+    POLL_REPLY_EXTENSION_OFFSET,
+    PORT_OUTPUT,
+    QUIET_TIME,
+    TARGETED_MODE,
+)
+
+SIMULATOR_IP = "127.0.0.2"
+DISCOVERY_IP = "127.0.0.1"
+FIRST_NODE_IP = "10.0.0.1"
+POLL_REPLY_LENGTH = 239
+PORTS_PER_BIND_INDEX = 4
+TARGET_RANGE = struct.Struct(">HH")
+
+
+def poll_reply(ip, mac, bind_index, universes, name):
+    """ArtPollReply of one bind index with an output port per universe.
+
+    The universes share Net and Sub-Net, as in a real reply.
+    """
+    reply = bytearray(POLL_REPLY_LENGTH)
+    sw_out = bytes(universe & 0x0F for universe in universes)
+    POLL_REPLY.pack_into(
+        reply,
+        0,
+        ARTNET_ID,
+        OP_POLL_REPLY.to_bytes(2, "little"),
+        socket.inet_aton(ip),
+        ARTNET_PORT.to_bytes(2, "little"),
+        1,  # VersInfo
+        universes[0] >> 8,
+        (universes[0] >> 4) & 0x0F,
+        0xFFFF,  # OEM unknown
+        0,  # Ubea
+        0xE0,  # Status1: indicators normal, network addressed
+        0,  # EstaManLo
+        0,  # EstaManHi
+        name[:17].encode("ascii"),
+        f"{name}, bind index {bind_index}"[:63].encode("ascii"),
+        b"#0001 [0000] Power On Tests successful",
+        len(universes),
+        bytes([PORT_OUTPUT] * len(universes)),
+        bytes(len(universes)),
+        bytes([0x80] * len(universes)),  # GoodOutputA: data is being sent
+        bytes(len(universes)),
+        sw_out,
+    )
+    POLL_REPLY_EXTENSION.pack_into(
+        reply,
+        POLL_REPLY_EXTENSION_OFFSET,
+        0,  # Style: StNode
+        mac,
+        socket.inet_aton(ip),
+        bind_index,
+        0x0E,  # Status2: web, DHCP capable, 15 bit Port-Address
+    )
+    return bytes(reply)
+
+
+def virtual_nodes(count: int, ports: int = 1, first_ip: str = FIRST_NODE_IP):
+    """ArtPollReplies of count nodes with ports output ports each.
+
+    A node with more than four ports answers with one reply per bind index,
+    like a real multi-port node. Returns SimpleNamespace(ip, bind_index,
+    universes, reply) records, one per reply.
+    """
+    first = int(ipaddress.IPv4Address(first_ip))
+    replies = []
+    universe = 0
+    for number in range(count):
+        ip = str(ipaddress.IPv4Address(first + number))
+        # locally administered MAC addresses
+        mac = (0x020000000000 + number).to_bytes(6, "big")
+        name = f"Node {number + 1}"
+        for bind_index, port in enumerate(range(0, ports, PORTS_PER_BIND_INDEX), 1):
+            port_count = min(PORTS_PER_BIND_INDEX, ports - port)
+            if (universe & 0x0F) + port_count > 16:
+                # the ports of a reply can not cross a Sub-Net
+                universe = (universe | 0x0F) + 1
+            universe &= MAX_PORT_ADDRESS
+            universes = [universe + offset for offset in range(port_count)]
+            universe += port_count
+            replies.append(
+                SimpleNamespace(
+                    ip=ip,
+                    bind_index=bind_index,
+                    universes=universes,
+                    reply=poll_reply(ip, mac, bind_index, universes, name),
+                )
+            )
+    return replies
+
+
+class ArtNetSimulator(asyncio.DatagramProtocol):
+    """Answer every ArtPoll with the replies of the virtual nodes.
+
+    Each reply is delayed by a random time up to jitter seconds and lost
+    with the probability loss. Targeted ArtPolls are answered only by the
+    nodes with a port in the targeted Port-Address range.
+    """
+
+    def __init__(self, nodes, jitter: float = 0.0, loss: float = 0.0, seed=None):
+        self.nodes = nodes
+        self.jitter = jitter
+        self.loss = loss
+        self.random = random.Random(seed)
+        self.transport = None
+        self.polls = 0
+        self.sent = 0
+        self.lost = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if len(data) < 14 or not data.startswith(ARTNET_ID) or data[8:10] != OP_POLL:
+            return
+        self.polls += 1
+        target = None
+        if len(data) >= 18 and data[12] & TARGETED_MODE:
+            top, bottom = TARGET_RANGE.unpack_from(data, 14)
+            target = range(bottom, top + 1)
+        loop = asyncio.get_running_loop()
+        for node in self.nodes:
+            if target is not None and not any(
+                universe in target for universe in node.universes
+            ):
+                continue
+            if self.loss and self.random.random() < self.loss:
+                self.lost += 1
+                continue
+            self.sent += 1
+            if self.jitter:
+                loop.call_later(
+                    self.random.uniform(0, self.jitter),
+                    self.transport.sendto,
+                    node.reply,
+                    addr,
+                )
+            else:
+                self.transport.sendto(node.reply, addr)
+
+    def error_received(self, exc):
+        pass
+
+
+async def start_simulator(nodes, host: str = SIMULATOR_IP, **kwargs):
+    """Listen for ArtPolls on host, returns the transport and the simulator."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    sock.bind((host, ARTNET_PORT))
+    sock.setblocking(False)
+    return await asyncio.get_running_loop().create_datagram_endpoint(
+        lambda: ArtNetSimulator(nodes, **kwargs), sock=sock
+    )
+
+
+async def run_benchmark(
+    count: int,
+    ports: int = 1,
+    jitter: float = 0.0,
+    loss: float = 0.0,
+    chunk: int = 0,
+    timeout: float = 5.0,
+    quiet: float = QUIET_TIME,
+    host: str = SIMULATOR_IP,
+    bind_ip: str = DISCOVERY_IP,
+):
+    """Discover count simulated nodes once.
+
+    Completeness is the share of the replies found, complete_after the
+    time from the poll to the last found reply.
+    """
+    nodes = virtual_nodes(count, ports)
+    transport, simulator = await start_simulator(
+        nodes, host, jitter=jitter, loss=loss, seed=count
+    )
+    try:
+        discovery = ArtNetDiscovery(
+            interfaces=[SimpleNamespace(name="simulator", ip=bind_ip, broadcast=host)]
+        )
+        discovery.start()
+        started = time.perf_counter()
+        devices = await discovery.discover(timeout=timeout, quiet=quiet, chunk=chunk)
+        wall = time.perf_counter() - started
+    finally:
+        transport.close()
+    expected = {(node.ip, node.bind_index) for node in nodes}
+    found = [
+        device
+        for device in devices
+        if (device["reported_ip"], device["bind_index"]) in expected
+    ]
+    return SimpleNamespace(
+        nodes=count,
+        replies=len(expected),
+        found=len(found),
+        completeness=len(found) / len(expected),
+        complete_after=max((device["latency"] for device in found), default=None),
+        wall=wall,
+        lost=simulator.lost,
+        stats=discovery.stats,
+    )
+
+
+def parse_rate(nodes, seconds: float = 1.0):
+    """ArtPollReplies parsed per second by ArtNetDiscovery."""
+    discovery = ArtNetDiscovery()
+    replies = [node.reply for node in nodes]
+    addr = (SIMULATOR_IP, ARTNET_PORT)
+    parsed = 0
+    started = time.perf_counter()
+    while (elapsed := time.perf_counter() - started) < seconds:
+        for reply in replies:
+            if discovery._is_artpoll_reply(reply):
+                discovery._parse_artpoll_reply(reply, addr)
+        parsed += len(replies)
+    return parsed / elapsed
+
+
+async def benchmark(counts, **kwargs):
+    print(
+        f"{'nodes':>7} {'replies':>7} {'found':>7} {'complete':>9} "
+        f"{'last reply':>10} {'wall':>7} {'dropped':>7}"
+    )
+    for count in counts:
+        result = await run_benchmark(count, **kwargs)
+        complete_after = (
+            f"{result.complete_after * 1000:.0f} ms"
+            if result.complete_after is not None
+            else "-"
+        )
+        dropped = "-" if result.stats.dropped is None else result.stats.dropped
+        print(
+            f"{result.nodes:>7} {result.replies:>7} {result.found:>7} "
+            f"{result.completeness:>8.1%} {complete_after:>10} "
+            f"{result.wall:>6.2f}s {dropped:>7}"
+        )
+    rate = parse_rate(virtual_nodes(max(counts), kwargs.get("ports", 1)))
+    print(f"ArtPollReply parsing: {rate:,.0f} replies/s")
+
+
+async def serve(nodes, host, **kwargs):
+    transport, simulator = await start_simulator(nodes, host, **kwargs)
+    print(f"Simulating {len(nodes)} ArtPollReplies on {host}, Ctrl+C to stop")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        transport.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("mode", choices=("serve", "benchmark"))
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument(
+        "--counts", default="100,1000,5000", help="node counts of the benchmark"
+    )
+    parser.add_argument("--ports", type=int, default=1, help="output ports per node")
+    parser.add_argument("--jitter", type=float, default=0.0, help="seconds")
+    parser.add_argument("--loss", type=float, default=0.0, help="0 to 1")
+    parser.add_argument("--chunk", type=int, default=0, help="targeted poll size")
+    parser.add_argument("--timeout", type=float, default=5.0)
+    parser.add_argument("--quiet", type=float, default=QUIET_TIME)
+    parser.add_argument("--host", default=SIMULATOR_IP)
+    parser.add_argument("--bind", default=DISCOVERY_IP, help="discovery address")
+    args = parser.parse_args()
+
+    try:
+        if args.mode == "serve":
+            nodes = virtual_nodes(args.nodes, args.ports)
+            asyncio.run(serve(nodes, args.host, jitter=args.jitter, loss=args.loss))
+        else:
+            counts = [int(count) for count in args.counts.split(",")]
+            asyncio.run(
+                benchmark(
+                    counts,
+                    ports=args.ports,
+                    jitter=args.jitter,
+                    loss=args.loss,
+                    chunk=args.chunk,
+                    timeout=args.timeout,
+                    quiet=args.quiet,
+                    host=args.host,
+                    bind_ip=args.bind,
+                )
+            )
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
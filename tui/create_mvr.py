@@ -15,11 +15,79 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from types import SimpleNamespace
+import uuid
 import pymvr
 from pathlib import Path
 
+DISCOVERED_MVR = "discovered_devices.mvr"
+DISCOVERY_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_DNS, "discovery.mvrtokuma")
+DISCOVERY_LAYER_NAME = "Network discovery"
+DISCOVERY_LAYER_UUID = str(uuid.uuid5(DISCOVERY_NAMESPACE, "layer"))
 
-def create_mvr(devices):
+
+def device_uuid(device):
+    """Stable fixture uuid of a discovered device.
+
+    Derived from the MAC address and bind index of the node, or from the IP
+    address and bind index when the node does not report its MAC, so the
+    same device gets the same uuid in every discovery run. A uuid already
+    assigned to the device is kept.
+    """
+    if getattr(device, "uuid", None):
+        return device.uuid
+    bind_index = getattr(device, "bind_index", None) or 1
+    mac = getattr(device, "mac", None)
+    if mac:
+        name = f"mac:{mac.lower()}/{bind_index}"
+    else:
+        name = f"ip:{device.ip_address}/{bind_index}"
+    return str(uuid.uuid5(DISCOVERY_NAMESPACE, name))
+
+
+def dmx_address(device):
+    """(universe, address) of a discovered device, None if it has no DMX patch."""
+    if device.address is None:
+        return None
+    try:
+        return int(device.universe or 1), int(device.address or 1)
+    except ValueError:
+        return 1, 1
+
+
+def discovery_fixtures(devices):
+    """Fixtures and tags of discovered devices, in the get_fixtures format.
+
+    The same data as importing the MVR file written by create_mvr, without
+    writing and parsing the file.
+    """
+    layer = SimpleNamespace(uuid=DISCOVERY_LAYER_UUID, name=DISCOVERY_LAYER_NAME)
+    fixtures = []
+    for device in devices:
+        if device.ip_address is None:
+            continue
+        universe, address = dmx_address(device) or (None, None)
+        fixtures.append(
+            SimpleNamespace(
+                uuid=device_uuid(device),
+                name=device.short_name,
+                layer=layer.uuid,
+                classing=None,
+                position=None,
+                ipv4=device.ip_address,
+                universe=universe,
+                address=address,
+            )
+        )
+    tags = {
+        "classes": [],
+        "positions": [],
+        "layers": [SimpleNamespace(uuid=layer.uuid, name=layer.name, id="")],
+    }
+    return ([SimpleNamespace(layer=layer, fixtures=fixtures)], tags)
+
+
+def create_mvr(devices, output_path=DISCOVERED_MVR):
     mvr_writer = pymvr.GeneralSceneDescriptionWriter()
     scene_obj = pymvr.Scene()
     aux_data = pymvr.AUXData()
@@ -27,7 +95,7 @@ def create_mvr(devices):
     scene_obj.layers = layers
     scene_obj.aux_data = aux_data
 
-    layer = pymvr.Layer(name="Network discovery")
+    layer = pymvr.Layer(name=DISCOVERY_LAYER_NAME, uuid=DISCOVERY_LAYER_UUID)
     layers.append(layer)
 
     child_list = pymvr.ChildList()
@@ -36,21 +104,17 @@ def create_mvr(devices):
     for net_fixture in devices:
         if net_fixture.ip_address is None:
             continue
-        fixture = pymvr.Fixture(name=net_fixture.short_name)
+        fixture = pymvr.Fixture(
+            name=net_fixture.short_name, uuid=device_uuid(net_fixture)
+        )
         fixture.addresses.network.append(pymvr.Network(ipv4=net_fixture.ip_address))
-        if net_fixture.address is not None:
-            address = 1
-            universe = 1
-            try:
-                address = int(net_fixture.address or 1)
-                universe = int(net_fixture.universe or 1)
-            except:
-                ...
+        dmx = dmx_address(net_fixture)
+        if dmx is not None:
             fixture.addresses.address.append(
                 pymvr.Address(
                     dmx_break=0,
-                    universe=universe,
-                    address=address,
+                    universe=dmx[0],
+                    address=dmx[1],
                 )
             )
 
@@ -58,5 +122,6 @@ def create_mvr(devices):
 
     scene_obj.to_xml(parent=mvr_writer.xml_root)
 
-    output_path = Path("discovered_devices.mvr")
+    output_path = Path(output_path)
     mvr_writer.write_mvr(output_path)
+    return output_path
@@ -0,0 +1,141 @@
+# Copyright (C) 2025 vanous
+#
+# This file is part of MVRtoKuma.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from types import SimpleNamespace
+from pathlib import Path
+import json
+import os
+import time
+from tui.create_mvr import device_uuid
+
+DISCOVERED_DEVICES = "discovered_devices.json"
+DEVICE_FIELDS = (
+    "uuid",
+    "ip_address",
+    "short_name",
+    "universe",
+    "address",
+    "mac",
+    "bind_index",
+    "first_seen",
+    "last_seen",
+)
+# a change of these is a change of the device set, last_seen alone is not
+MVR_FIELDS = ("ip_address", "short_name", "universe", "address")
+
+
+class DiscoveryStore:
+    """All devices seen by the network discovery runs, with last seen times.
+
+    Devices are found by their MAC address and bind index, or by their IP
+    address and bind index when the MAC of either is unknown, so a device answering
+    in a later run updates its entry instead of being added again.
+    """
+
+    def __init__(self, path: str = DISCOVERED_DEVICES):
+        self.path = Path(path)
+        self.devices = {}
+        self.by_mac = {}
+        self.by_ip = {}
+        if self.path.exists():
+            try:
+                with open(self.path, "r") as f:
+                    for data in json.load(f).get("devices", []):
+                        self._add(
+                            SimpleNamespace(
+                                **{field: data.get(field) for field in DEVICE_FIELDS}
+                            )
+                        )
+            except (json.JSONDecodeError, OSError):
+                pass
+
+    def __len__(self):
+        return len(self.devices)
+
+    def _add(self, device):
+        self.devices[device.uuid] = device
+        if device.mac:
+            self.by_mac[(device.mac, device.bind_index)] = device
+        self.by_ip[(device.ip_address, device.bind_index)] = device
+
+    def find(self, device):
+        bind_index = device.bind_index or 1
+        if device.mac:
+            known = self.by_mac.get((device.mac, bind_index))
+            if known is not None:
+                return known
+        known = self.by_ip.get((device.ip_address, bind_index))
+        if known is not None and known.mac and device.mac:
+            # a different node reusing the IP address, not the known one
+            return None
+        return known
+
+    def update(self, devices, now=None):
+        """Add or refresh the devices of a discovery run.
+
+        Returns the number of new devices and of known devices which changed
+        their address, name or DMX patch.
+        """
+        now = now or time.time()
+        added = 0
+        changed = 0
+        for device in devices:
+            if device.ip_address is None:
+                continue
+            known = self.find(device)
+            if known is None:
+                self._add(
+                    SimpleNamespace(
+                        uuid=device_uuid(device),
+                        ip_address=device.ip_address,
+                        short_name=device.short_name,
+                        universe=device.universe,
+                        address=device.address,
+                        mac=device.mac,
+                        bind_index=device.bind_index or 1,
+                        first_seen=now,
+                        last_seen=now,
+                    )
+                )
+                added += 1
+                continue
+            known.last_seen = now
+            if device.mac and not known.mac:
+                known.mac = device.mac
+                self.by_mac[(known.mac, known.bind_index)] = known
+            if any(
+                getattr(known, field) != getattr(device, field) for field in MVR_FIELDS
+            ):
+                self.by_ip.pop((known.ip_address, known.bind_index), None)
+                for field in MVR_FIELDS:
+                    setattr(known, field, getattr(device, field))
+                self._add(known)
+                changed += 1
+        return added, changed
+
+    def list(self):
+        return sorted(self.devices.values(), key=lambda device: device.first_seen)
+
+    def save(self):
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {"devices": [vars(device) for device in self.devices.values()]},
+                f,
+                indent=4,
+            )
+        os.replace(tmp_path, self.path)
@@ -15,27 +15,111 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import sys
 
-class KumaFixture:
-    def __init__(self, data=None):
-        if data is None:
-            return
-        self.name = data.get("name", "")
-        self.id = data.get("id", 0)
-        self.uuid = data.get("description", "")
-        self.tags = [tag.get("name") for tag in data.get("tags", [])]
+
+class KumaMonitor:
+    """An Uptime Kuma monitor, the description holds the MVR fixture uuid."""
+
+    __slots__ = ("id", "name", "uuid")
+
+    def __init__(self, id, name, uuid):
+        self.id = id
+        self.name = name
+        self.uuid = uuid
 
     def __str__(self):
-        return f"{self.name=} {self.id=} {self.description=} tags={','.join(self.tags)}"
+        return f"{self.name=} {self.id=} {self.uuid=}"
 
 
 class KumaTag:
-    def __init__(self, data=None):
-        if data is None:
-            return
-        self.id = data.get("id", 0)
-        self.name = data.get("name", "")
-        self.uuid = data.get("uuid", 0)
+    __slots__ = ("id", "name", "uuid")
+
+    def __init__(self, id, name):
+        self.id = id
+        self.name = name
+        self.uuid = None  # Uptime Kuma tags have no uuid
 
     def __str__(self):
         return f"{self.name=} {self.id=}"
+
+
+class KumaState:
+    """The Uptime Kuma monitors and tags, indexed for the sync.
+
+    Monitors are found by the fixture uuid in their description, tags by
+    name and by id, and the tag ids attached to every monitor are kept as
+    sets, so the sync does no linear scans.
+    """
+
+    def __init__(self, monitors=(), tags=()):
+        self.tags = {}  # id: KumaTag
+        self.tags_by_name = {}
+        self.monitors = {}  # id: KumaMonitor
+        self.by_uuid = {}
+        self.monitor_tags = {}  # monitor id: set of tag ids
+        self.set_tags(tags)
+        self.set_monitors(monitors)
+
+    @classmethod
+    def from_api(cls, api):
+        return cls(monitors=api.get_monitors(), tags=api.get_tags())
+
+    def _add_tag(self, tag_id, name):
+        tag = KumaTag(tag_id, sys.intern(name or ""))
+        self.tags[tag_id] = tag
+        # the first tag of a name wins, as in the Uptime Kuma tag list
+        self.tags_by_name.setdefault(tag.name, tag)
+
+    def set_tags(self, tags):
+        """Replace the tags by the get_tags result."""
+        self.tags = {}
+        self.tags_by_name = {}
+        for tag in tags:
+            self._add_tag(tag.get("id", 0), tag.get("name", ""))
+
+    def set_monitors(self, monitors):
+        """Replace the monitors by the get_monitors result."""
+        self.monitors = {}
+        self.by_uuid = {}
+        self.monitor_tags = {}
+        for monitor in monitors:
+            monitor_id = monitor.get("id", 0)
+            self.add_monitor(
+                monitor_id, monitor.get("name", ""), monitor.get("description", "")
+            )
+            for tag in monitor.get("tags", []):
+                tag_id = tag.get("tag_id")
+                if tag_id not in self.tags:
+                    self._add_tag(tag_id, tag.get("name"))
+                self.monitor_tags[monitor_id].add(tag_id)
+
+    def add_monitor(self, monitor_id, name, uuid):
+        monitor = KumaMonitor(monitor_id, sys.intern(name or ""), uuid or "")
+        self.monitors[monitor_id] = monitor
+        if monitor.uuid:
+            self.by_uuid.setdefault(monitor.uuid, monitor)
+        self.monitor_tags.setdefault(monitor_id, set())
+        return monitor
+
+    def monitor(self, uuid):
+        return self.by_uuid.get(uuid)
+
+    def tag(self, name):
+        return self.tags_by_name.get(name)
+
+    def has_tag(self, monitor_id, tag_id):
+        return tag_id in self.monitor_tags.get(monitor_id, ())
+
+    def attach(self, monitor_id, tag_id):
+        self.monitor_tags.setdefault(monitor_id, set()).add(tag_id)
+
+    def detach(self, monitor_id, tag_id):
+        self.monitor_tags.get(monitor_id, set()).discard(tag_id)
+
+    def monitor_tag_names(self, monitor):
+        return [
+            self.tags[tag_id].name
+            for tag_id in self.monitor_tags.get(monitor.id, ())
+            if tag_id in self.tags
+        ]
@@ -0,0 +1,210 @@
+# Copyright (C) 2025 vanous
+#
+# This file is part of MVRtoKuma.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from array import array
+from collections import namedtuple
+from types import SimpleNamespace
+import socket
+import sys
+from tui.read_mvr import get_dmx_address, get_ipv4
+
+FixtureRow = namedtuple(
+    "FixtureRow",
+    ["uuid", "name", "ipv4", "universe", "address", "layer", "classing", "position"],
+)
+
+
+def ipv4_to_int(ipv4):
+    if not ipv4:
+        return 0
+    try:
+        return int.from_bytes(socket.inet_aton(ipv4), "big")
+    except OSError:
+        return 0
+
+
+def int_to_ipv4(value):
+    if not value:
+        return None
+    return socket.inet_ntoa(value.to_bytes(4, "big"))
+
+
+class TagColumn:
+    """Distinct layers, classes or positions, referenced by small int codes.
+
+    Code 0 means no tag, so the tags list starts with a None placeholder.
+    """
+
+    def __init__(self):
+        self.tags = [None]
+        self.codes = {}
+        self.names = {}
+
+    def code(self, uuid, name):
+        if not uuid:
+            return 0
+        code = self.codes.get(uuid)
+        if code is None:
+            code = len(self.tags)
+            self.codes[uuid] = code
+            tag = SimpleNamespace(uuid=uuid, name=name, id="")
+            self.tags.append(tag)
+            self.names.setdefault(name, tag)
+        return code
+
+    def __iter__(self):
+        return iter(self.tags[1:])
+
+    def __len__(self):
+        return len(self.tags) - 1
+
+    def by_name(self, name):
+        return self.names.get(name)
+
+    def name_of(self, uuid):
+        """Name of the tag with uuid, None for no or an unknown tag."""
+        code = self.codes.get(uuid)
+        if code is None:
+            return None
+        return self.tags[code].name
+
+
+class FixtureTable:
+    """The imported MVR fixtures, one row per fixture, stored by column.
+
+    Strings are interned, IPv4 addresses and DMX addresses are kept in
+    typed arrays and layers, classes and positions as TagColumn codes.
+    """
+
+    def __init__(self):
+        self.uuid = []
+        self.name = []
+        self.ipv4 = array("I")
+        self.universe = array("I")
+        self.address = array("H")
+        self.layer = array("H")
+        self.classing = array("H")
+        self.position = array("H")
+        self.layers = TagColumn()
+        self.classes = TagColumn()
+        self.positions = TagColumn()
+        self.index = {}
+
+    @classmethod
+    def from_parsed(cls, fixtures, tags):
+        table = cls()
+        table.extend(fixtures, tags)
+        return table
+
+    def __len__(self):
+        return len(self.uuid)
+
+    def __bool__(self):
+        return bool(self.uuid)
+
+    def __contains__(self, uuid):
+        return uuid in self.index
+
+    def extend(self, fixtures, tags):
+        """Add the (fixtures, tags) result of get_fixtures.
+
+        A fixture already in the table, matched by uuid, is updated in place.
+        """
+        for tag in tags.get("classes", []):
+            self.classes.code(tag.uuid, tag.name)
+        for tag in tags.get("positions", []):
+            self.positions.code(tag.uuid, tag.name)
+
+        for layer in fixtures:
+            layer_code = self.layers.code(layer.layer.uuid, layer.layer.name)
+            for fixture in layer.fixtures or []:
+                self.add(
+                    uuid=fixture.uuid,
+                    name=fixture.name,
+                    ipv4=get_ipv4(fixture),
+                    dmx=get_dmx_address(fixture),
+                    layer_code=layer_code,
+                    class_code=self.classes.codes.get(fixture.classing, 0),
+                    position_code=self.positions.codes.get(
+                        getattr(fixture, "position", None), 0
+                    ),
+                )
+
+    def add(self, uuid, name, ipv4, dmx, layer_code, class_code, position_code):
+        if not uuid:
+            # a fixture without uuid cannot be matched to a monitor, skip it
+            return
+        row = self.index.get(uuid)
+        if row is not None:
+            # the same fixture imported again, keep the newer data
+            self.name[row] = sys.intern(name or "")
+            self.ipv4[row] = ipv4_to_int(ipv4)
+            self.universe[row] = dmx[0] or 0
+            self.address[row] = dmx[1] or 0
+            self.layer[row] = layer_code
+            self.classing[row] = class_code
+            self.position[row] = position_code
+            return
+        self.index[uuid] = len(self.uuid)
+        self.uuid.append(sys.intern(uuid))
+        self.name.append(sys.intern(name or ""))
+        self.ipv4.append(ipv4_to_int(ipv4))
+        self.universe.append(dmx[0] or 0)
+        self.address.append(dmx[1] or 0)
+        self.layer.append(layer_code)
+        self.classing.append(class_code)
+        self.position.append(position_code)
+
+    def remove(self, uuids):
+        """Drop the fixtures with the given uuids, unused tags are kept."""
+        keep = [row for row, uuid in enumerate(self.uuid) if uuid not in uuids]
+        if len(keep) == len(self.uuid):
+            return
+        self.uuid = [self.uuid[row] for row in keep]
+        self.name = [self.name[row] for row in keep]
+        for column in ("ipv4", "universe", "address", "layer", "classing", "position"):
+            values = getattr(self, column)
+            setattr(self, column, array(values.typecode, (values[row] for row in keep)))
+        self.index = {uuid: row for row, uuid in enumerate(self.uuid)}
+
+    def row(self, row):
+        class_ = self.classes.tags[self.classing[row]]
+        position = self.positions.tags[self.position[row]]
+        return FixtureRow(
+            uuid=self.uuid[row],
+            name=self.name[row],
+            ipv4=int_to_ipv4(self.ipv4[row]),
+            universe=self.universe[row] or None,
+            address=self.address[row] or None,
+            layer=self.layers.tags[self.layer[row]],
+            classing=class_.uuid if class_ else None,
+            position=position.uuid if position else None,
+        )
+
+    def rows(self):
+        for row in range(len(self.uuid)):
+            yield self.row(row)
+
+    def get(self, uuid):
+        row = self.index.get(uuid)
+        if row is None:
+            return None
+        return self.row(row)
+
+    def tags(self):
+        """All tags, in the order used by the MVR data listing."""
+        return list(self.positions) + list(self.classes) + list(self.layers)
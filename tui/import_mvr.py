@@ -0,0 +1,86 @@
+# Copyright (C) 2025 vanous
+#
+# This file is part of MVRtoKuma.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import multiprocessing
+import os
+from tui.read_mvr import get_fixtures
+from tui.mvr_cache import MvrCache, pack_records, unpack_records
+
+
+def find_mvr_files(directory):
+    return sorted(
+        path
+        for path in Path(directory).iterdir()
+        if path.is_file() and path.suffix.lower() == ".mvr"
+    )
+
+
+def parse_packed(file_path, streaming=False):
+    """Parse one MVR file in a worker process, return compact records."""
+    fixtures, tags = get_fixtures(file_path, streaming=streaming)
+    # pymvr objects are expensive to pickle, send the packed records instead
+    return pack_records(fixtures, tags)
+
+
+def import_files(file_paths, streaming=False, use_cache=True, max_workers=None):
+    """Parse MVR files in a process pool.
+
+    Yields (file_path, fixtures, tags, error) as each file finishes, so the
+    results can be shown before the slowest file is done. The cache is only
+    read and written here, the workers just parse.
+    """
+    cache = MvrCache() if use_cache else None
+    misses = []
+    for file_path in file_paths:
+        if cache is None:
+            misses.append(file_path)
+            continue
+        try:
+            result = cache.get(file_path)
+        except Exception as e:
+            yield (file_path, None, None, e)
+            continue
+        if result is None:
+            misses.append(file_path)
+        else:
+            yield (file_path, *result, None)
+    if not misses:
+        return
+    max_workers = min(len(misses), max_workers or os.cpu_count() or 1)
+    # spawn, forking the threaded TUI process is not safe
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+        futures = {
+            pool.submit(parse_packed, str(file_path), streaming): file_path
+            for file_path in misses
+        }
+        for future in as_completed(futures):
+            file_path = futures[future]
+            try:
+                blob = future.result()
+                fixtures, tags = unpack_records(blob)
+            except Exception as e:
+                yield (file_path, None, None, e)
+                continue
+            if cache is not None:
+                try:
+                    cache.put_packed(file_path, blob)
+                except OSError:
+                    pass
+            yield (file_path, fixtures, tags, None)
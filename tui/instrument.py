@@ -0,0 +1,150 @@
+# Copyright (C) 2025 vanous
+#
+# This file is part of MVRtoKuma.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import threading
+import time
+
+TIMINGS_FILE = "timings.json"
+
+
+class PhaseStats:
+    __slots__ = ("name", "runs", "wall", "items", "api_calls")
+
+    def __init__(self, name):
+        self.name = name
+        self.runs = 0
+        self.wall = 0.0
+        self.items = 0
+        self.api_calls = 0
+
+    def to_dict(self):
+        return {
+            "runs": self.runs,
+            "wall_s": round(self.wall, 6),
+            "items": self.items,
+            "api_calls": self.api_calls,
+        }
+
+    def __str__(self):
+        return (
+            f"{self.name}: {self.wall:.3f} s, {self.items} item(s), "
+            f"{self.api_calls} API call(s), {self.runs} run(s)"
+        )
+
+
+class _Phase:
+    __slots__ = ("instrumentation", "name", "items", "api_calls", "start")
+
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.items = 0
+        self.api_calls = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.instrumentation._record(
+            self.name, time.perf_counter() - self.start, self.items, self.api_calls
+        )
+
+
+class _NullPhase:
+    """Shared do-nothing phase, used while instrumentation is disabled.
+
+    The counters always read 0 and ignore writes, so the one instance used
+    by all worker threads stays stateless.
+    """
+
+    __slots__ = ()
+
+    @property
+    def items(self):
+        return 0
+
+    @items.setter
+    def items(self, value):
+        pass
+
+    @property
+    def api_calls(self):
+        return 0
+
+    @api_calls.setter
+    def api_calls(self, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+
+NULL_PHASE = _NullPhase()
+
+
+class Instrumentation:
+    """Wall time, item and API call counters per phase of the sync.
+
+    Usage:
+        with instrumentation.phase("parse") as phase:
+            phase.items += len(fixtures)
+            phase.api_calls += 1
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.phases = {}
+        self.lock = threading.Lock()
+
+    def phase(self, name):
+        if not self.enabled:
+            return NULL_PHASE
+        return _Phase(self, name)
+
+    def _record(self, name, wall, items, api_calls):
+        with self.lock:
+            stats = self.phases.get(name)
+            if stats is None:
+                stats = self.phases[name] = PhaseStats(name)
+            stats.runs += 1
+            stats.wall += wall
+            stats.items += items
+            stats.api_calls += api_calls
+
+    def reset(self):
+        with self.lock:
+            self.phases = {}
+
+    def to_dict(self):
+        with self.lock:
+            return {name: stats.to_dict() for name, stats in self.phases.items()}
+
+    def summary(self):
+        with self.lock:
+            return "\n".join(str(stats) for stats in self.phases.values())
+
+    def dump(self, path: str = TIMINGS_FILE):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=4)
+
+
+instrumentation = Instrumentation()
@@ -16,33 +16,21 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from types import SimpleNamespace
-import pymvr
 from pathlib import Path
-from copy import deepcopy
+import json
+from tui.patch_mvr import scan_network_objects, write_patched_mvr
 
+MERGED_MVR = "merged_with_network.mvr"
 
-def process_mvr_child_list(child_list, result):
-    for fixture in child_list.fixtures:
-        result.append((fixture))
-    for group in child_list.group_objects:
-        if group.child_list is not None:
-            process_mvr_child_list(group.child_list, result)
 
+class MergeCancelled(Exception):
+    """The merge was cancelled through is_cancelled."""
 
-def get_fixtures(file_path):
-    path = Path(file_path)
-    fixtures = []
 
-    mvr_scene = pymvr.GeneralSceneDescription(path)
-    if hasattr(mvr_scene, "scene") and mvr_scene.scene:
-        for layer in mvr_scene.scene.layers:
-            if layer.child_list is not None:
-                process_mvr_child_list(layer.child_list, fixtures)
-
-    return (
-        mvr_scene,
-        fixtures,
-    )
+PRECEDENCE_RULES = {
+    "first": "First listed file wins",
+    "newest": "Newest file wins",
+}
 
 
 def get_ipv4_network(fixture):
@@ -57,53 +45,173 @@ def get_address(fixture):
             return address
 
 
-def address_equals(this, that):
-    return this.address == that.address and this.universe == that.universe
-
+def address_key(address):
+    return (address.dmx_break, address.universe, address.address)
+
+
+def order_sources(in_paths, precedence="first"):
+    """Sort the IP source files, the file with the highest precedence first."""
+    if precedence not in PRECEDENCE_RULES:
+        raise ValueError(f"Unknown merge precedence: {precedence}")
+    in_paths = [Path(in_path) for in_path in in_paths]
+    if precedence == "newest":
+        in_paths.sort(key=lambda in_path: in_path.stat().st_mtime_ns, reverse=True)
+    return in_paths
+
+
+def match_fixtures(in_sources, out_fixtures):
+    """Find the IPv4 network of the source fixtures for matching out_fixtures.
+
+    in_sources is a list of (source name, fixtures), the highest precedence
+    first. Fixtures are matched by uuid first, then by DMX break, universe
+    and address. Both lookups go through indexes built once, so matching is
+    a single pass over the source fixtures.
+
+    An out fixture already matched by a source with higher precedence keeps
+    its network, a different IPv4 from a later source is listed in conflicts.
+    Returns the match statistics and the patches, a dict of out fixture uuid
+    to the IPv4 pymvr.Network to set.
+    """
+    stats = SimpleNamespace(by_uuid=0, by_dmx=0, unmatched=0, conflicts={})
+    out_by_uuid = {out_fixture.uuid: out_fixture for out_fixture in out_fixtures}
+    out_by_dmx = {}
+    for out_fixture in out_fixtures:
+        out_address = get_address(out_fixture)
+        if out_address is not None:
+            out_by_dmx.setdefault(address_key(out_address), []).append(out_fixture)
+    patches = {}
+    origins = {}
+
+    def claim(out_fixture, in_ipv4_network, source):
+        """Patch out_fixture, False if a higher precedence source has it."""
+        network = patches.get(out_fixture.uuid)
+        if network is None:
+            patches[out_fixture.uuid] = in_ipv4_network
+            origins[out_fixture.uuid] = source
+            return True
+        if network.ipv4 != in_ipv4_network.ipv4:
+            conflict = stats.conflicts.setdefault(
+                out_fixture.uuid,
+                {
+                    "uuid": out_fixture.uuid,
+                    "name": out_fixture.name,
+                    "ipv4": network.ipv4,
+                    "source": origins[out_fixture.uuid],
+                    "rejected": [],
+                },
+            )
+            conflict["rejected"].append(
+                {"ipv4": in_ipv4_network.ipv4, "source": source}
+            )
+        return False
+
+    for source, in_fixtures in in_sources:
+        done_already = set()
+        # last first, same order as the original pop() based loop
+        for in_fixture in reversed(in_fixtures):
+            in_ipv4_network = get_ipv4_network(in_fixture)
+            if in_ipv4_network is None:
+                continue  # we cannot use fixtures without network...
+
+            out_fixture = out_by_uuid.get(in_fixture.uuid)
+            if out_fixture is not None and out_fixture.uuid not in done_already:
+                # match by uuid:
+                done_already.add(out_fixture.uuid)
+                if claim(out_fixture, in_ipv4_network, source):
+                    stats.by_uuid += 1
+                continue
 
-def copy_network(in_ipv4_network, out_fixture):
-    out_ipv4_network = get_ipv4_network(out_fixture)
-    if out_ipv4_network is None:
-        ipv4 = deepcopy(in_ipv4_network)
-        out_fixture.addresses.network.append(ipv4)
+            in_address = get_address(in_fixture)
+            matched = False
+            if in_address is not None:
+                # match by break, universe and address, all fixtures patched there
+                for out_fixture in out_by_dmx.get(address_key(in_address), []):
+                    if out_fixture.uuid in done_already:
+                        continue
+                    done_already.add(out_fixture.uuid)
+                    if claim(out_fixture, in_ipv4_network, source):
+                        stats.by_dmx += 1
+                    matched = True
+            if not matched:
+                stats.unmatched += 1
+
+    stats.conflicts = list(stats.conflicts.values())
+    return stats, patches
+
+
+def write_conflict_report(report_path, in_paths, precedence, conflicts):
+    with open(report_path, "w") as f:
+        json.dump(
+            {
+                "precedence": precedence,
+                "sources": [str(in_path) for in_path in in_paths],
+                "conflicts": conflicts,
+            },
+            f,
+            indent=4,
+        )
+
+
+def merger(
+    in_paths,
+    out_path,
+    output_path=MERGED_MVR,
+    precedence="first",
+    progress=None,
+    is_cancelled=None,
+):
+    """Copy IPv4 addresses from the in_paths MVRs into out_path.
+
+    in_paths is one IP source file or a list of them, conflicting addresses
+    are resolved by the precedence rule and written to a conflict report
+    next to output_path. Only the network addresses of the matched objects
+    are changed, the rest of out_path, including GDTF files and models, is
+    copied as is.
+
+    progress(text) is called after every step. When is_cancelled() returns
+    True, MergeCancelled is raised and output_path is left untouched.
+    """
+
+    def step(text):
+        if is_cancelled is not None and is_cancelled():
+            raise MergeCancelled()
+        if progress is not None:
+            progress(text)
+
+    if isinstance(in_paths, (str, Path)):
+        in_paths = [in_paths]
+    in_paths = order_sources(in_paths, precedence)
+    files = len(in_paths) + 1
+    in_sources = []
+    for number, in_path in enumerate(in_paths, 1):
+        in_sources.append((str(in_path), scan_network_objects(in_path)))
+        step(f"Parsed file {number}/{files}")
+    out_fixtures = scan_network_objects(out_path)
+    step(f"Parsed file {files}/{files}")
+    stats, patches = match_fixtures(in_sources, out_fixtures)
+    step(f"Matched {len(patches)}/{len(out_fixtures)} fixtures")
+
+    step(f"Writing {output_path}")
+    written = SimpleNamespace(percent=0)
+
+    def writing(done, total):
+        percent = min(done * 100 // total, 100) if total else 100
+        if percent != written.percent:
+            written.percent = percent
+            step(f"Writing {output_path} {percent} %")
+
+    write_patched_mvr(out_path, output_path, patches, writing)
+
+    output_path = Path(output_path)
+    stats.output_path = output_path
+    report_path = output_path.with_name(f"{output_path.stem}_conflicts.json")
+    stats.report_path = None
+    if stats.conflicts:
+        stats.report_path = report_path
+        write_conflict_report(report_path, in_paths, precedence, stats.conflicts)
     else:
-        out_ipv4_network = deepcopy(in_ipv4_network)
-
-
-def merger(in_path, out_path):
-    in_scene, in_fixtures = get_fixtures(in_path)
-    out_scene, out_fixtures = get_fixtures(out_path)
-    done_already = []
-
-    while in_fixtures:
-        in_fixture = in_fixtures.pop()
-        in_address = get_address(in_fixture)
-        in_ipv4_network = get_ipv4_network(in_fixture)
-        if in_ipv4_network is None:
-            continue  # we cannot use fixtures without network...
-
-        for out_fixture in out_fixtures:
-            if out_fixture.uuid in done_already:
-                continue
-            if in_fixture.uuid == out_fixture.uuid:
-                # match by uuid:
-                copy_network(in_ipv4_network, out_fixture)
-                done_already.append(out_fixture.uuid)
-                break
-            out_address = get_address(out_fixture)
-            if in_address is None or out_address is None:
-                continue  # no uuid match and one or both fixtures have no dmx, so we cannot match, skip
-
-            if address_equals(in_address, out_address):
-                # match by universe and address
-                copy_network(in_ipv4_network, out_fixture)
-                done_already.append(out_fixture.uuid)
-
-    mvr_writer = pymvr.GeneralSceneDescriptionWriter()
-    out_scene.scene.to_xml(parent=mvr_writer.xml_root)
-    out_scene.user_data.to_xml(parent=mvr_writer.xml_root)
-    output_path = Path("merged_with_network.mvr")
-    mvr_writer.write_mvr(output_path)
+        report_path.unlink(missing_ok=True)  # from an earlier merge
+    return stats
 
 
 if __name__ == "__main__":
@@ -21,12 +21,52 @@ from textual.message import Message
 class MvrParsed(Message):
     """Message sent when monitors are fetched from the API."""
 
+    def __init__(
+        self,
+        fixtures: list | None = None,
+        tags: list | None = None,
+        filename: str | None = None,
+    ) -> None:
+        self.fixtures = fixtures
+        self.tags = tags
+        self.filename = filename
+        super().__init__()
+
+
+class MvrChanged(Message):
+    """Message sent when a watched MVR file has been re-read."""
+
     def __init__(self, fixtures: list | None = None, tags: list | None = None) -> None:
         self.fixtures = fixtures
         self.tags = tags
         super().__init__()
 
 
+class MergeProgress(Message):
+    """Message sent while MVR files are being merged."""
+
+    def __init__(self, text: str = "") -> None:
+        self.text = text
+        super().__init__()
+
+
+class MvrMerged(Message):
+    """Message sent when an MVR merge has finished."""
+
+    def __init__(self, stats=None) -> None:
+        self.stats = stats
+        super().__init__()
+
+
+class MvrExported(Message):
+    """Message sent when discovered devices have been saved as an MVR file."""
+
+    def __init__(self, path: str | None = None, error: str = "") -> None:
+        self.path = path
+        self.error = error
+        super().__init__()
+
+
 class Errors(Message):
     """Message sent when monitors are fetched from the API."""
 
@@ -38,7 +78,29 @@ class Errors(Message):
 class DevicesDiscovered(Message):
     """Message sent when monitors are fetched from the API."""
 
-    def __init__(self, devices: list | None = None, error: str = "") -> None:
+    def __init__(
+        self, devices: list | None = None, error: str = "", stats=None
+    ) -> None:
         self.devices = devices
         self.error = error
+        self.stats = stats
+        super().__init__()
+
+
+class DevicesChanged(Message):
+    """Message sent when monitoring saw devices appear, go or change status."""
+
+    def __init__(
+        self,
+        appeared: list | None = None,
+        gone: list | None = None,
+        changed: list | None = None,
+        seen: list | None = None,
+        error: str = "",
+    ) -> None:
+        self.appeared = appeared or []
+        self.gone = gone or []
+        self.changed = changed or []
+        self.seen = seen or []
+        self.error = error
         super().__init__()
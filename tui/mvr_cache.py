@@ -0,0 +1,219 @@
+# Copyright (C) 2025 vanous
+#
+# This file is part of MVRtoKuma.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from types import SimpleNamespace
+from pathlib import Path
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from tui.read_mvr import get_dmx_address, get_ipv4
+
+CACHE_VERSION = 2
+MAX_CACHE_SIZE = 64 * 1024 * 1024
+
+
+def user_cache_dir():
+    """Per-user cache directory of MVRtoKuma, outside of the working directory."""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local"
+    elif sys.platform == "darwin":
+        base = Path.home() / "Library" / "Caches"
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "MVRtoKuma" / "mvr_cache"
+
+
+def file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "blake2b").hexdigest()[:32]
+
+
+def pack_records(fixtures, tags):
+    layers = []
+    for layer in fixtures:
+        rows = []
+        for fixture in layer.fixtures or []:
+            universe, address = get_dmx_address(fixture)
+            rows.append(
+                [
+                    fixture.uuid,
+                    fixture.name,
+                    fixture.classing,
+                    getattr(fixture, "position", None),
+                    get_ipv4(fixture),
+                    universe,
+                    address,
+                ]
+            )
+        layers.append([layer.layer.uuid, layer.layer.name, rows])
+    packed_tags = {
+        key: [[tag.uuid, tag.name] for tag in value] for key, value in tags.items()
+    }
+    data = {"version": CACHE_VERSION, "layers": layers, "tags": packed_tags}
+    return zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+
+
+def unpack_records(blob):
+    data = json.loads(zlib.decompress(blob))
+    if data.get("version") != CACHE_VERSION:
+        return None
+    fixtures = []
+    for layer_uuid, layer_name, rows in data["layers"]:
+        fixtures.append(
+            SimpleNamespace(
+                layer=SimpleNamespace(uuid=layer_uuid, name=layer_name),
+                fixtures=[
+                    SimpleNamespace(
+                        uuid=uuid,
+                        name=name,
+                        layer=layer_uuid,
+                        classing=classing,
+                        position=position,
+                        ipv4=ipv4,
+                        universe=universe,
+                        address=address,
+                    )
+                    for uuid, name, classing, position, ipv4, universe, address in rows
+                ],
+            )
+        )
+    tags = {
+        key: [SimpleNamespace(uuid=uuid, name=name, id="") for uuid, name in value]
+        for key, value in data["tags"].items()
+    }
+    return (fixtures, tags)
+
+
+class MvrCache:
+    """On-disk cache of fixture/tag records extracted from MVR files.
+
+    Entries are stored by content hash, the index maps a file path to its
+    size, mtime and hash, so an unchanged file is found without hashing it
+    again. The least recently used entries are evicted above max_size.
+    """
+
+    def __init__(self, cache_dir: str | None = None, max_size: int = MAX_CACHE_SIZE):
+        self.cache_dir = Path(cache_dir) if cache_dir else user_cache_dir()
+        self.max_size = max_size
+        self.index_path = self.cache_dir / "index.json"
+        self.index = {"paths": {}, "entries": {}}
+        if self.index_path.exists():
+            try:
+                with open(self.index_path, "r") as f:
+                    self.index = json.load(f)
+            except (json.JSONDecodeError, OSError):
+                pass
+
+    def _key(self, file_path, digest=None):
+        path = Path(file_path).resolve()
+        stat = path.stat()
+        known = self.index["paths"].get(str(path))
+        if (
+            digest is None
+            and known
+            and known["size"] == stat.st_size
+            and known["mtime"] == stat.st_mtime_ns
+        ):
+            digest = known["digest"]
+        if digest is None:
+            digest = file_digest(path)
+        self.index["paths"][str(path)] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "digest": digest,
+        }
+        return digest
+
+    def get(self, file_path):
+        digest = self._key(file_path)
+        entry = self.index["entries"].get(digest)
+        if entry is None:
+            return None
+        try:
+            result = unpack_records((self.cache_dir / f"{digest}.bin").read_bytes())
+        except (OSError, ValueError, zlib.error):
+            result = None
+        if result is None:
+            self.index["entries"].pop(digest, None)
+        else:
+            entry["used"] = time.time()
+        self._save_index()
+        return result
+
+    def put(self, file_path, fixtures, tags):
+        self.put_packed(file_path, pack_records(fixtures, tags))
+
+    def put_packed(self, file_path, blob):
+        """Store records already packed by pack_records()."""
+        digest = self._key(file_path)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        (self.cache_dir / f"{digest}.bin").write_bytes(blob)
+        self.index["entries"][digest] = {"size": len(blob), "used": time.time()}
+        self._evict()
+        self._save_index()
+
+    def clear(self):
+        for digest in list(self.index["entries"]):
+            self._remove(digest)
+        self.index = {"paths": {}, "entries": {}}
+        self._save_index()
+
+    def _remove(self, digest):
+        self.index["entries"].pop(digest, None)
+        try:
+            os.remove(self.cache_dir / f"{digest}.bin")
+        except OSError:
+            pass
+
+    def _evict(self):
+        entries = self.index["entries"]
+        total = sum(entry["size"] for entry in entries.values())
+        for digest in sorted(entries, key=lambda digest: entries[digest]["used"]):
+            if total <= self.max_size:
+                break
+            total -= entries[digest]["size"]
+            self._remove(digest)
+        self.index["paths"] = {
+            path: known
+            for path, known in self.index["paths"].items()
+            if known["digest"] in entries
+        }
+
+    def _save_index(self):
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # unique per writer, a shared tmp file could be renamed under another one
+        tmp_path = self.index_path.with_suffix(
+            f".{os.getpid()}.{threading.get_ident()}.tmp"
+        )
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self.index_path)
+
+
+def get_cached_fixtures(file_path, parse, cache=None):
+    """Return (fixtures, tags) of file_path from the cache, parse() on a miss."""
+    cache = cache or MvrCache()
+    result = cache.get(file_path)
+    if result is not None:
+        return result
+    fixtures, tags = parse(file_path)
+    cache.put(file_path, fixtures, tags)
+    return (fixtures, tags)
@@ -15,19 +15,195 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+from types import SimpleNamespace
+import ipaddress
+import re
+import select
+import socket
+import threading
 import ifaddr
 
+EACH_INTERFACE = "each"
+MAX_SWEEP_HOSTS = 1 << 16
+NETLINK_ROUTE = 0
+RTMGRP_LINK = 0x01
+RTMGRP_IPV4_IFADDR = 0x10
+REFRESH_INTERVAL = 30.0
+SETTLE_TIME = 0.2
 
-def get_network_cards():
-    all_cards = [("All interfaces 0.0.0.0", "0.0.0.0")]
+
+def _enumerate_interfaces():
+    interfaces = []
     for adapter in ifaddr.get_adapters():
         for ip in adapter.ips:
             if isinstance(ip.ip, tuple):  # Skip IPv6
                 continue
             if ip.ip.startswith("169.254."):  # Skip link-local
                 continue
+            network = ipaddress.IPv4Network(
+                f"{ip.ip}/{ip.network_prefix}", strict=False
+            )
+            interfaces.append(
+                SimpleNamespace(
+                    name=adapter.nice_name,
+                    ip=ip.ip,
+                    prefix=ip.network_prefix,
+                    broadcast=str(network.broadcast_address),
+                    loopback=ip.ip.startswith("127."),
+                )
+            )
+    return interfaces
+
+
+def _open_netlink():
+    """Socket receiving the address and link changes, on Linux only."""
+    if not hasattr(socket, "AF_NETLINK"):
+        return None
+    try:
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR))
+    except OSError:
+        return None
+    return sock
+
+
+class InterfaceService:
+    """The IPv4 interfaces, enumerated once and refreshed in the background.
+
+    Changes are noticed via netlink on Linux, and by enumerating again every
+    interval seconds everywhere. Listeners are called with the new list
+    from the background thread when the interfaces have changed.
+    """
+
+    def __init__(self, interval: float = REFRESH_INTERVAL):
+        self.interval = interval
+        self.interfaces = None
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.netlink = None
+
+    @property
+    def uses_netlink(self):
+        return self.netlink is not None
+
+    def start(self):
+        if self.thread is not None:
+            return
+        self.netlink = _open_netlink()
+        self.thread = threading.Thread(target=self._run, name="interfaces", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def get(self):
+        """The cached interfaces, enumerated now if not known yet."""
+        with self.lock:
+            if self.interfaces is None:
+                self.interfaces = _enumerate_interfaces()
+            return list(self.interfaces)
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def refresh(self):
+        interfaces = _enumerate_interfaces()
+        with self.lock:
+            changed = interfaces != self.interfaces
+            self.interfaces = interfaces
+        if changed:
+            for listener in list(self.listeners):
+                listener(list(interfaces))
+
+    def _wait_for_change(self):
+        readable, _, _ = select.select([self.netlink], [], [], self.interval)
+        # one change comes as several messages, read until they settle
+        while readable:
+            try:
+                self.netlink.recv(64 * 1024)
+            except OSError:
+                break
+            readable, _, _ = select.select([self.netlink], [], [], SETTLE_TIME)
 
-            label = f"{adapter.nice_name} ({ip.ip})"
-            value = ip.ip
-            all_cards.append((label, value))
+    def _run(self):
+        try:
+            self.refresh()
+            while not self.stopped.is_set():
+                if self.uses_netlink:
+                    self._wait_for_change()
+                else:
+                    self.stopped.wait(self.interval)
+                if not self.stopped.is_set():
+                    self.refresh()
+        finally:
+            if self.netlink is not None:
+                self.netlink.close()
+                self.netlink = None
+            self.thread = None
+
+
+interface_service = InterfaceService()
+
+
+def get_network_cards():
+    all_cards = [
+        ("All interfaces 0.0.0.0", "0.0.0.0"),
+        ("Each interface separately", EACH_INTERFACE),
+    ]
+    for interface in interface_service.get():
+        label = f"{interface.name} ({interface.ip})"
+        all_cards.append((label, interface.ip))
     return all_cards
+
+
+def get_interfaces():
+    """IPv4 interfaces with their directed broadcast address.
+
+    Returns SimpleNamespace(name, ip, prefix, broadcast, loopback) records,
+    loopback and link-local addresses are skipped.
+    """
+    return [
+        interface for interface in interface_service.get() if not interface.loopback
+    ]
+
+
+def parse_networks(text):
+    """IPv4 networks of a comma or space separated list of CIDR ranges."""
+    return [
+        ipaddress.IPv4Network(part, strict=False)
+        for part in re.split(r"[,\s]+", text.strip())
+        if part
+    ]
+
+
+def interface_networks():
+    """Networks of the local interfaces, derived from their netmasks."""
+    networks = {}
+    for interface in get_interfaces():
+        network = ipaddress.IPv4Network(
+            f"{interface.ip}/{interface.prefix}", strict=False
+        )
+        networks[network] = None
+    return list(networks)
+
+
+def sweep_targets(networks, unicast: bool = False):
+    """Addresses to poll in a sweep of the networks.
+
+    The directed broadcast of every network, or every host address of the
+    networks for a unicast sweep.
+    """
+    if not unicast:
+        return [str(network.broadcast_address) for network in networks]
+    hosts = sum(network.num_addresses for network in networks)
+    if hosts > MAX_SWEEP_HOSTS:
+        raise ValueError(
+            f"Unicast sweep of {hosts} addresses, at most {MAX_SWEEP_HOSTS} are allowed"
+        )
+    return [str(host) for network in networks for host in network.hosts()]
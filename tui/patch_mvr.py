@@ -0,0 +1,355 @@
+# Copyright (C) 2025 vanous
+#
+# This file is part of MVRtoKuma.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import deque
+from types import SimpleNamespace
+from xml.etree import ElementTree
+from xml.parsers import expat
+from pathlib import Path
+import copy
+import os
+import struct
+import zipfile
+import pymvr
+from tui.read_mvr import SCENE_XML, read_scene_chunks
+from tui.walk_mvr import NETWORK_OBJECT_TAGS
+
+OBJECT_TAGS = frozenset(("Fixture",) + NETWORK_OBJECT_TAGS)
+LOCAL_FILE_HEADER = struct.Struct("<4s2B4HL2L2H")
+EXTRA_FIELD_HEADER = struct.Struct("<2H")
+ZIP64_EXTRA_ID = 0x0001
+DATA_DESCRIPTOR_FLAG = 0x08
+COPY_SIZE = 1024 * 1024
+
+
+class _ObjectScanner:
+    """expat handlers collecting uuid and addresses of network objects."""
+
+    def __init__(self):
+        self.objects = []
+        self.stack = []
+        self.open = []
+        self.address = None
+        self.address_text = []
+        self.parser = expat.ParserCreate()
+        self.parser.buffer_text = True
+        self.parser.StartElementHandler = self.start
+        self.parser.EndElementHandler = self.end
+        self.parser.CharacterDataHandler = self.text
+
+    def in_addresses(self):
+        """The current element is in the Addresses of the innermost object."""
+        return (
+            self.open
+            and len(self.stack) == self.open[-1].depth + 3
+            and self.stack[-2] == "Addresses"
+        )
+
+    def start(self, name, attributes):
+        self.stack.append(name)
+        if name in OBJECT_TAGS:
+            self.open.append(
+                SimpleNamespace(
+                    tag=name,
+                    depth=len(self.stack) - 1,
+                    uuid=attributes.get("uuid"),
+                    name=attributes.get("name") or "",
+                    addresses=pymvr.Addresses(),
+                )
+            )
+        elif not self.in_addresses():
+            return
+        elif name == "Address":
+            self.address = ElementTree.Element(name, attributes)
+            self.address_text = []
+        elif name == "Network":
+            element = ElementTree.Element(name, attributes)
+            self.open[-1].addresses.network.append(pymvr.Network(xml_node=element))
+
+    def text(self, data):
+        if self.address is not None:
+            self.address_text.append(data)
+
+    def end(self, name):
+        if self.address is not None:
+            self.address.text = "".join(self.address_text) or None
+            self.open[-1].addresses.address.append(pymvr.Address(xml_node=self.address))
+            self.address = None
+        elif (
+            name in OBJECT_TAGS
+            and self.open
+            and self.open[-1].depth == len(self.stack) - 1
+        ):
+            scanned = self.open.pop()
+            if scanned.tag == "Fixture" or scanned.addresses.network:
+                self.objects.append(
+                    SimpleNamespace(
+                        uuid=scanned.uuid,
+                        name=scanned.name,
+                        addresses=scanned.addresses,
+                    )
+                )
+        self.stack.pop()
+
+
+def scan_network_objects(file_path):
+    """Collect uuid and addresses of fixtures and other network objects.
+
+    Returns SimpleNamespace(uuid, name, addresses) records, addresses being a
+    pymvr.Addresses, for the same objects as walk_scene. The scene XML is
+    streamed, no pymvr object tree is built.
+    """
+    scanner = _ObjectScanner()
+    for chunk in read_scene_chunks(file_path):
+        scanner.parser.Parse(chunk, False)
+    scanner.parser.Parse(b"", True)
+    return scanner.objects
+
+
+def network_xml(network):
+    return ElementTree.tostring(network.to_xml(ElementTree.Element("Addresses")))
+
+
+class ScenePatcher:
+    """Rewrite the scene XML while streaming it, setting IPv4 networks.
+
+    patches maps an object uuid to the pymvr.Network to set. The first IPv4
+    <Network> of every patched object is replaced, or a new one is added,
+    all other bytes of the XML are written out unchanged. Only the currently
+    open patched object is held in memory.
+    """
+
+    def __init__(self, patches, write):
+        self.patches = patches
+        self.write = write
+        self.patched = set()
+        self.buffer = bytearray()
+        self.offset = 0  # stream position of self.buffer[0]
+        self.reported = 0  # stream position of the last expat event
+        self.edits = deque()  # (start, end, data), in document order
+        self.stack = []
+        self.open = []
+        self.parser = expat.ParserCreate()
+        self.parser.StartElementHandler = self.start
+        self.parser.EndElementHandler = self.end
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        self.parser.Parse(chunk, False)
+        # expat may defer events, keep everything it has not reported yet
+        until = self.reported
+        if self.open:
+            until = min(until, self.open[0].start)
+        self.flush(until)
+
+    def close(self):
+        self.parser.Parse(b"", True)
+        self.flush(self.offset + len(self.buffer))
+
+    def flush(self, until):
+        parts = []
+        position = self.offset
+        while self.edits and self.edits[0][1] <= until:
+            start, end, data = self.edits.popleft()
+            parts.append(self.buffer[position - self.offset : start - self.offset])
+            parts.append(data)
+            position = end
+        if self.edits:
+            until = min(until, self.edits[0][0])
+        until = max(until, position)
+        parts.append(self.buffer[position - self.offset : until - self.offset])
+        self.write(b"".join(parts))
+        del self.buffer[: until - self.offset]
+        self.offset = until
+
+    def is_empty(self, start):
+        """The element starting at start is written as <Tag ... />."""
+        quote = None
+        for position in range(start - self.offset, len(self.buffer)):
+            byte = self.buffer[position]
+            if quote is not None:
+                if byte == quote:
+                    quote = None
+            elif byte in b"\"'":
+                quote = byte
+            elif byte == ord(">"):
+                return self.buffer[position - 1] == ord("/")
+        return False
+
+    def element_end(self, start, index):
+        """Stream position after the element starting at start.
+
+        index is the position reported by expat at the end of the element,
+        right after an empty element or at its closing tag.
+        """
+        if self.is_empty(start):
+            return index
+        return self.buffer.index(b">", index - self.offset) + 1 + self.offset
+
+    def start(self, name, attributes):
+        index = self.reported = self.parser.CurrentByteIndex
+        depth = len(self.stack)
+        self.stack.append(name)
+        if name in OBJECT_TAGS and attributes.get("uuid") in self.patches:
+            uuid = attributes["uuid"]
+            self.open.append(
+                SimpleNamespace(
+                    tag=name,
+                    uuid=uuid,
+                    depth=depth,
+                    start=index,
+                    network=network_xml(self.patches[uuid]),
+                    addresses_start=None,
+                    network_start=None,
+                    done=False,
+                )
+            )
+            return
+        if not self.open:
+            return
+        current = self.open[-1]
+        if name == "Addresses" and depth == current.depth + 1:
+            current.addresses_start = index
+        elif (
+            name == "Network"
+            and depth == current.depth + 2
+            and self.stack[-2] == "Addresses"
+            and not current.done
+            and attributes.get("ipv4")
+        ):
+            current.network_start = index
+
+    def end(self, name):
+        index = self.reported = self.parser.CurrentByteIndex
+        self.stack.pop()
+        depth = len(self.stack)
+        if not self.open:
+            return
+        current = self.open[-1]
+        if name == "Network" and current.network_start is not None:
+            end = self.element_end(current.network_start, index)
+            self.edits.append((current.network_start, end, current.network))
+            current.network_start = None
+            current.done = True
+        elif name == "Addresses" and depth == current.depth + 1 and not current.done:
+            if self.is_empty(current.addresses_start):
+                data = b"<Addresses>" + current.network + b"</Addresses>"
+                self.edits.append((current.addresses_start, index, data))
+            else:
+                self.edits.append((index, index, current.network))
+            current.done = True
+        elif name == current.tag and depth == current.depth:
+            self.open.pop()
+            if not current.done:
+                data = b"<Addresses>" + current.network + b"</Addresses>"
+                if self.is_empty(current.start):
+                    # <Fixture ... /> becomes <Fixture ...>...</Fixture>
+                    start_tag = self.buffer[
+                        current.start - self.offset : index - self.offset
+                    ]
+                    data = bytes(start_tag[:-2]) + b">" + data + f"</{name}>".encode()
+                    self.edits.append((current.start, index, data))
+                else:
+                    self.edits.append((index, index, data))
+            self.patched.add(current.uuid)
+
+
+def _strip_zip64_extra(extra):
+    stripped = bytearray()
+    position = 0
+    while position + EXTRA_FIELD_HEADER.size <= len(extra):
+        field_id, length = EXTRA_FIELD_HEADER.unpack_from(extra, position)
+        end = position + EXTRA_FIELD_HEADER.size + length
+        if field_id != ZIP64_EXTRA_ID:
+            stripped += extra[position:end]
+        position = end
+    return bytes(stripped)
+
+
+def copy_member(source, target, info):
+    """Copy a zip member as is, without inflating and compressing it again.
+
+    zipfile has no API for this, so the local header is written here and
+    the member is added to the central directory written by target.close().
+    """
+    source.fp.seek(info.header_offset)
+    header = LOCAL_FILE_HEADER.unpack(source.fp.read(LOCAL_FILE_HEADER.size))
+    # skip the file name and extra field of the local header
+    source.fp.seek(header[-2] + header[-1], os.SEEK_CUR)
+
+    copied = copy.copy(info)
+    # sizes and CRC are known, they go to the local header
+    copied.flag_bits &= ~DATA_DESCRIPTOR_FLAG
+    copied.extra = _strip_zip64_extra(info.extra)
+    copied.header_offset = target.fp.tell()
+    target.fp.write(copied.FileHeader())
+    remaining = info.compress_size
+    while remaining:
+        data = source.fp.read(min(remaining, COPY_SIZE))
+        if not data:
+            raise zipfile.BadZipFile(f"Truncated member {info.filename}")
+        target.fp.write(data)
+        remaining -= len(data)
+    target.filelist.append(copied)
+    target.NameToInfo[copied.filename] = copied
+    target.start_dir = target.fp.tell()
+
+
+def _write_scene(source_path, target, info, patches, progress=None):
+    scene_info = zipfile.ZipInfo(SCENE_XML, date_time=info.date_time)
+    scene_info.compress_type = info.compress_type
+    force_zip64 = info.file_size > zipfile.ZIP64_LIMIT // 2
+    with target.open(scene_info, "w", force_zip64=force_zip64) as scene_xml:
+        patcher = ScenePatcher(patches, scene_xml.write)
+        done = 0
+        for chunk in read_scene_chunks(source_path):
+            patcher.feed(chunk)
+            done += len(chunk)
+            if progress is not None:
+                progress(done, info.file_size)
+        patcher.close()
+    return patcher.patched
+
+
+def write_patched_mvr(source_path, output_path, patches, progress=None):
+    """Write source_path to output_path with the IPv4 networks patched.
+
+    All members but the scene XML are copied byte for byte. The output is
+    written to a temporary file first and moved in place when complete, so
+    an exception raised by progress(done, total), called with the bytes of
+    the scene XML written so far, leaves output_path untouched. Returns the
+    set of patched object uuids.
+    """
+    output_path = Path(output_path)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    patched = set()
+    try:
+        with zipfile.ZipFile(source_path, "r") as source:
+            with zipfile.ZipFile(tmp_path, "w") as target:
+                target.comment = source.comment
+                for info in source.infolist():
+                    if info.filename == SCENE_XML:
+                        patched = _write_scene(
+                            source_path, target, info, patches, progress
+                        )
+                    else:
+                        copy_member(source, target, info)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return patched
@@ -16,71 +16,216 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from types import SimpleNamespace
+from xml.etree import ElementTree
+import sys
+import zipfile
 import pymvr
 from pathlib import Path
+from tui.walk_mvr import NETWORK_OBJECT_TAGS
+from tui.walk_mvr import walk_scene
 
+SCENE_XML = "GeneralSceneDescription.xml"
+CHUNK_SIZE = 64 * 1024
 
-def process_mvr_child_list(child_list, result):
-    for fixture in child_list.fixtures:
-        result.append((fixture))
-    for group in child_list.group_objects:
-        if group.child_list is not None:
-            process_mvr_child_list(group.child_list, result)
 
+def read_scene_chunks(file_path):
+    """Read the scene XML member of an MVR file in chunks.
 
-def get_fixtures(file_path):
+    Only GeneralSceneDescription.xml is opened, GDTF files, models and
+    textures in the archive are never inflated.
+    """
+    with zipfile.ZipFile(file_path, "r") as archive:
+        with archive.open(SCENE_XML, "r") as scene_xml:
+            while chunk := scene_xml.read(CHUNK_SIZE):
+                # same as pymvr, tolerate a trailing NUL written by some tools
+                yield chunk.rstrip(b"\x00")
+
+
+def read_scene(file_path):
+    """Parse the scene XML of an MVR file into pymvr Scene and UserData.
+
+    A lighter stand-in for pymvr.GeneralSceneDescription, which decodes the
+    whole XML into a string before parsing it.
+    """
+    parser = ElementTree.XMLParser()
+    for chunk in read_scene_chunks(file_path):
+        parser.feed(chunk)
+    root = parser.close()
+
+    mvr_scene = SimpleNamespace(
+        version_major=root.get("verMajor", ""),
+        version_minor=root.get("verMinor", ""),
+        provider=root.get("provider", ""),
+        provider_version=root.get("providerVersion", ""),
+        scene=None,
+        user_data=None,
+    )
+    scene = root.find("Scene")
+    if scene is not None:
+        mvr_scene.scene = pymvr.Scene(xml_node=scene)
+    user_data = root.find("UserData")
+    if user_data is not None:
+        mvr_scene.user_data = pymvr.UserData(xml_node=user_data)
+    return mvr_scene
+
+
+def get_fixtures(file_path, streaming=False):
+    if streaming:
+        return get_fixtures_streaming(file_path)
     path = Path(file_path)
+    walked = walk_scene(read_scene(path).scene)
+
+    fixtures = walked.layers
+    tags = {
+        "classes": [
+            SimpleNamespace(uuid=class_.uuid, name=class_.name, id="")
+            for class_ in walked.classes.values()
+        ],
+        "positions": [
+            SimpleNamespace(uuid=position.uuid, name=position.name, id="")
+            for position in walked.positions.values()
+        ],
+        "layers": [
+            SimpleNamespace(uuid=layer.layer.uuid, name=layer.layer.name, id="")
+            for layer in walked.layers
+        ],
+    }
+    return (fixtures, tags)
+
+
+def get_ipv4(fixture):
+    """First IPv4 of a pymvr Fixture or of a streamed fixture record."""
+    if hasattr(fixture, "addresses"):
+        for network in fixture.addresses.network:
+            if network.ipv4:
+                return network.ipv4
+        return None
+    return fixture.ipv4
+
+
+def get_dmx_address(fixture):
+    """(universe, address) of a pymvr Fixture or of a streamed fixture record."""
+    if hasattr(fixture, "addresses"):
+        for address in fixture.addresses.address:
+            if address:
+                return address.universe, address.address
+        return None, None
+    return fixture.universe, fixture.address
+
+
+def _fixture_record(element, layer_uuid):
+    classing = element.findtext("Classing")
+    position = element.findtext("Position")
+    ipv4 = None
+    universe = None
+    address = None
+    addresses = element.find("Addresses")
+    if addresses is not None:
+        for network in addresses.iterfind("Network"):
+            if network.get("ipv4"):
+                ipv4 = network.get("ipv4")
+                break
+        dmx_address = addresses.find("Address")
+        if dmx_address is not None:
+            dmx_address = pymvr.Address(xml_node=dmx_address)
+            universe = dmx_address.universe
+            address = dmx_address.address
+    return SimpleNamespace(
+        uuid=element.get("uuid"),
+        name=element.get("name") or "",
+        layer=layer_uuid,
+        classing=sys.intern(classing) if classing else None,
+        position=sys.intern(position) if position else None,
+        ipv4=ipv4,
+        universe=universe,
+        address=address,
+    )
+
+
+def iter_fixtures(file_path):
+    """Stream fixtures out of the scene XML of an MVR file.
+
+    Yields ("layer", namespace) when a layer starts, ("fixture", record) for
+    every fixture or other network addressable object and finally
+    ("aux", (classes, positions)) with uuid -> name dicts of the AUXData.
+    Parsed elements are dropped as soon as they were processed, so memory
+    stays bounded by a single fixture.
+    """
+    classes = {}
+    positions = {}
+    parser = ElementTree.XMLPullParser(events=("start", "end"))
+    stack = []
+    layer_uuid = None
+    for chunk in read_scene_chunks(file_path):
+        parser.feed(chunk)
+        for event, element in parser.read_events():
+            if event == "start":
+                if element.tag == "Layer":
+                    layer_uuid = sys.intern(element.get("uuid") or "")
+                    yield (
+                        "layer",
+                        SimpleNamespace(
+                            uuid=layer_uuid, name=element.get("name") or ""
+                        ),
+                    )
+                stack.append(element)
+                continue
+
+            stack.pop()
+            parent = stack[-1] if stack else None
+            if element.tag == "Fixture" or (
+                element.tag in NETWORK_OBJECT_TAGS
+                and element.find("Addresses/Network") is not None
+            ):
+                yield ("fixture", _fixture_record(element, layer_uuid))
+            elif parent is not None and parent.tag == "AUXData":
+                if element.tag == "Class":
+                    classes[element.get("uuid")] = element.get("name") or ""
+                elif element.tag == "Position":
+                    positions[element.get("uuid")] = element.get("name") or ""
+
+            if parent is not None and parent.tag in (
+                "ChildList",
+                "Layers",
+                "AUXData",
+            ):
+                parent.remove(element)
+    parser.close()
+    yield ("aux", (classes, positions))
+
+
+def get_fixtures_streaming(file_path):
+    """Low memory variant of get_fixtures, returns the same (fixtures, tags)."""
     fixtures = []
-    tags = {"classes": [], "layers": []}
-    classes = []
     layers = []
-    positions = []
-    with pymvr.GeneralSceneDescription(path) as mvr_scene:
-        if hasattr(mvr_scene, "scene") and mvr_scene.scene:
-            for layer in mvr_scene.scene.layers:
-                if layer.child_list is not None:
-                    layer_fixtures = []
-                    process_mvr_child_list(layer.child_list, layer_fixtures)
-                    layer_result = SimpleNamespace(
-                        layer=layer,
-                        fixtures=layer_fixtures,
-                    )
-                    fixtures.append(layer_result)
-
-        for layer in fixtures:
-            mvr_layer = layer.layer
-            if mvr_layer is not None:
-                layers.append(
-                    SimpleNamespace(uuid=mvr_layer.uuid, name=mvr_layer.name, id="")
-                )
-            for fixture in layer.fixtures or []:
-                fixture_class_uuid = fixture.classing
-                fixture_position_uuid = fixture.position
-                if hasattr(mvr_scene, "scene") and mvr_scene.scene:
-                    auxdata = mvr_scene.scene.aux_data
-                    if auxdata is not None:
-                        mvr_classes = auxdata.classes
-                        mvr_positions = auxdata.positions
-                print("added fixture")
-                for class_ in mvr_classes:
-                    if class_.uuid == fixture_class_uuid:
-                        if class_.name:
-                            class_ns = SimpleNamespace(
-                                uuid=class_.uuid, name=class_.name, id=""
-                            )
-                            if class_ns not in classes:
-                                classes.append(class_ns)
-                for position in mvr_positions:
-                    if position.uuid == fixture_position_uuid:
-                        if position.name:
-                            position_ns = SimpleNamespace(
-                                uuid=position.uuid, name=position.name, id=""
-                            )
-                            if position_ns not in positions:
-                                positions.append(position_ns)
-
-    tags["classes"] = classes
-    tags["positions"] = positions
-    tags["layers"] = layers
-    print("done mvr parsing", fixtures, tags)
+    used_classes = {}
+    used_positions = {}
+    layer_fixtures = None
+    aux_classes = {}
+    aux_positions = {}
+    for kind, item in iter_fixtures(file_path):
+        if kind == "fixture":
+            layer_fixtures.append(item)
+            used_classes[item.classing] = None
+            used_positions[item.position] = None
+        elif kind == "layer":
+            layer_fixtures = []
+            fixtures.append(SimpleNamespace(layer=item, fixtures=layer_fixtures))
+            layers.append(SimpleNamespace(uuid=item.uuid, name=item.name, id=""))
+        else:
+            aux_classes, aux_positions = item
+
+    tags = {
+        "classes": [
+            SimpleNamespace(uuid=uuid, name=aux_classes[uuid], id="")
+            for uuid in used_classes
+            if aux_classes.get(uuid)
+        ],
+        "positions": [
+            SimpleNamespace(uuid=uuid, name=aux_positions[uuid], id="")
+            for uuid in used_positions
+            if aux_positions.get(uuid)
+        ],
+        "layers": layers,
+    }
     return (fixtures, tags)
@@ -16,19 +16,39 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from types import SimpleNamespace
+from pathlib import Path
 from textual.screen import ModalScreen
 from textual.app import ComposeResult
 from textual.containers import Grid, Horizontal, Vertical
-from textual.widgets import Button, Static, Input, Label, Checkbox, Select
+from textual.widgets import Button, Static, Input, Label, Checkbox, Select, DataTable
 from textual import on, work, events
-from textual_fspicker import FileOpen, Filters
-from tui.messages import Errors, DevicesDiscovered
-from tui.merge_mvr import merger
-from tui.network import get_network_cards
-from tui.artnet import ArtNetDiscovery
-from tui.create_mvr import create_mvr
+from textual_fspicker import FileOpen, Filters, SelectDirectory
+from tui.messages import (
+    Errors,
+    DevicesDiscovered,
+    DevicesChanged,
+    MvrParsed,
+    MvrExported,
+)
+from tui.merge_mvr import PRECEDENCE_RULES
+from tui.network import (
+    get_network_cards,
+    get_interfaces,
+    interface_networks,
+    parse_networks,
+    sweep_targets,
+    interface_service,
+    EACH_INTERFACE,
+)
+from tui.artnet import ArtNetDiscovery, POLL_CHUNKS
+from tui.artnet_monitor import ArtNetMonitor, MONITOR_INTERVALS
+from tui.create_mvr import create_mvr, discovery_fixtures, DISCOVERED_MVR
+from tui.discovery_store import DiscoveryStore
+from tui.import_mvr import find_mvr_files
+import asyncio
 import re
 import sys
+import time
 
 
 class QuitScreen(ModalScreen[bool]):
@@ -120,6 +140,18 @@ class ConfigScreen(ModalScreen[dict]):
                 yield Label("UI Single Line:")
                 with Horizontal(id="details_checkbox_container"):
                     yield Checkbox(id="singleline_ui_toggle")
+            with Horizontal():
+                yield Label("Low memory MVR import:")
+                with Horizontal(id="details_checkbox_container"):
+                    yield Checkbox(id="low_memory_toggle")
+            with Horizontal():
+                yield Label("Cache imported MVR files:")
+                with Horizontal(id="details_checkbox_container"):
+                    yield Checkbox(id="mvr_cache_toggle")
+            with Horizontal():
+                yield Label("Record timings:")
+                with Horizontal(id="details_checkbox_container"):
+                    yield Checkbox(id="timings_toggle")
             yield Horizontal(
                 Button("Save", variant="success", id="save", classes="small_button"),
                 Button("Cancel", variant="error", id="cancel", classes="small_button"),
@@ -139,6 +171,15 @@ class ConfigScreen(ModalScreen[dict]):
             self.query_one("#singleline_ui_toggle", Checkbox).value = self.data.get(
                 "singleline_ui_toggle", True
             )
+            self.query_one("#low_memory_toggle", Checkbox).value = self.data.get(
+                "low_memory_toggle", False
+            )
+            self.query_one("#mvr_cache_toggle", Checkbox).value = self.data.get(
+                "mvr_cache_toggle", True
+            )
+            self.query_one("#timings_toggle", Checkbox).value = self.data.get(
+                "timings_toggle", False
+            )
 
         if self.app.singleline_ui_toggle:
             for button in self.query("Button"):
@@ -163,6 +204,9 @@ class ConfigScreen(ModalScreen[dict]):
                     "singleline_ui_toggle": self.query_one(
                         "#singleline_ui_toggle"
                     ).value,
+                    "low_memory_toggle": self.query_one("#low_memory_toggle").value,
+                    "mvr_cache_toggle": self.query_one("#mvr_cache_toggle").value,
+                    "timings_toggle": self.query_one("#timings_toggle").value,
                 }
             )
         else:
@@ -330,9 +374,17 @@ class MVRScreen(ModalScreen):
 
             with Horizontal(id="row2"):
                 yield Button("Import MVR", id="import_mvr")
-                yield Button("Merge MVR files", id="merge_mvr")
+                yield Button("Import MVR folder", id="import_mvr_folder")
+                yield Button(
+                    "Cancel Merge" if self.app.merge_running else "Merge MVR files",
+                    id="merge_mvr",
+                )
             with Horizontal(id="row3"):
                 yield Button("Network Discovery", id="artnet_screen")
+                yield Button(
+                    "Stop Watching" if self.app.watched_file else "Watch MVR",
+                    id="watch_mvr",
+                )
                 yield Button("Clean MVR data", id="clean_mvr")
             with Horizontal(id="row1"):
                 yield Button("Cancel", id="cancel")
@@ -344,20 +396,14 @@ class MVRScreen(ModalScreen):
 
         if event.button.id == "merge_mvr":
             self.dismiss()
-            self.app.push_screen(MVRMergeScreen())
+            if self.app.merge_running:
+                self.app.cancel_merge()
+            else:
+                self.app.push_screen(MVRMergeScreen())
 
         if event.button.id == "clean_mvr":
-            self.app.mvr_fixtures = []
-            self.app.mvr_classes = []
-            self.app.mvr_positions = []
-
-            self.app.mvr_tag_display.update_items(
-                self.app.mvr_positions
-                + self.app.mvr_classes
-                + [layer.layer for layer in self.app.mvr_fixtures]
-            )
-
-            self.app.mvr_fixtures_display.update_items(self.app.mvr_fixtures)
+            self.app.stop_watch()
+            self.app.clean_mvr_data()
             self.app.query_one("#json_output").update("[green]MVR data cleaned[/green]")
             self.app.query_one("#open_create_monitors").disabled = True
             self.dismiss()
@@ -376,6 +422,32 @@ class MVRScreen(ModalScreen):
 
             self.dismiss()
 
+        if event.button.id == "watch_mvr":
+            if self.app.watched_file:
+                self.app.stop_watch()
+                self.app.query_one("#json_output").update("Stopped watching MVR file")
+            elif opened := await self.app.push_screen_wait(
+                FileOpen(filters=Filters(("MVR", lambda p: p.suffix.lower() == ".mvr")))
+            ):
+                self.app.start_watch(opened)
+                self.app.query_one("#json_output").update(
+                    f"Watching {opened} for changes..."
+                )
+
+            self.dismiss()
+
+        if event.button.id == "import_mvr_folder":
+            if opened := await self.app.push_screen_wait(SelectDirectory()):
+                if mvr_files := find_mvr_files(opened):
+                    self.app.query_one("#json_output").update(
+                        f"Importing {len(mvr_files)} MVR file(s)..."
+                    )
+                    self.app.run_import_mvr_files(mvr_files)
+                else:
+                    self.app.post_message(Errors(error=f"No MVR files in {opened}"))
+
+            self.dismiss()
+
     def action_focus_next(self) -> None:
         self.focus_next()
 
@@ -391,7 +463,8 @@ class MVRMergeScreen(ModalScreen):
     """Screen with a dialog to confirm quitting."""
 
     file1 = None
-    file2 = None
+    sources = []
+    precedence = "first"
     BINDINGS = [
         ("left", "focus_previous", "Focus Previous"),
         ("right", "focus_next", "Focus Next"),
@@ -408,24 +481,28 @@ class MVRMergeScreen(ModalScreen):
 
             with Horizontal(id="row2"):
                 yield Button("Select MVR file 1", id="file_button1")
-                yield Button("Select MVR file 2 with IP addresses", id="file_button2")
+                yield Button("Add MVR file with IP addresses", id="file_button2")
             with Horizontal(id="row3"):
                 yield Static("", id="file_name1")
                 yield Static("", id="file_name2")
 
+            yield Select(
+                [(label, rule) for rule, label in PRECEDENCE_RULES.items()],
+                value=self.precedence,
+                allow_blank=False,
+                id="precedence_select",
+            )
+
             with Horizontal(id="row4"):
                 yield Button("Merge", id="do_merge", disabled=True)
 
+    def on_mount(self):
+        self.sources = []
+
     def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "do_merge":
-            if self.file1 and self.file2 and self.file1 != self.file2:
-                try:
-                    merger(self.file2, self.file1)
-                    self.app.query_one("#json_output").update(
-                        "[green]Done! Saved as `merged_with_network.mvr`[/green]"
-                    )
-                except Exception as e:
-                    self.post_message(Errors(error=str(e)))
+            if self.file1 and self.sources and self.file1 not in self.sources:
+                self.app.start_merge(list(self.sources), self.file1, self.precedence)
 
             self.dismiss()
 
@@ -446,15 +523,22 @@ class MVRMergeScreen(ModalScreen):
             if opened := await self.app.push_screen_wait(
                 FileOpen(filters=Filters(("MVR", lambda p: p.suffix.lower() == ".mvr")))
             ):
-                self.file2 = opened
+                if opened not in self.sources:
+                    self.sources.append(opened)
                 self.check_files()
 
+    @on(Select.Changed, "#precedence_select")
+    def precedence_changed(self, event: Select.Changed) -> None:
+        self.precedence = event.value
+
     def check_files(self):
         if self.file1:
             self.query_one("#file_name1").update(f"{self.file1.name}")
-        if self.file2:
-            self.query_one("#file_name2").update(f"{self.file2.name}")
-        if self.file1 is not None and self.file2 and self.file1 != self.file2:
+        if self.sources:
+            self.query_one("#file_name2").update(
+                ", ".join(source.name for source in self.sources)
+            )
+        if self.file1 is not None and self.sources and self.file1 not in self.sources:
             self.query_one("#do_merge").disabled = False
         else:
             self.query_one("#do_merge").disabled = True
@@ -475,6 +559,9 @@ class ArtNetScreen(ModalScreen):
 
     networks = []
     network = None
+    monitoring = False
+    devices = []
+    result = ""
     BINDINGS = [
         ("left", "focus_previous", "Focus Previous"),
         ("right", "focus_next", "Focus Next"),
@@ -487,6 +574,8 @@ class ArtNetScreen(ModalScreen):
             yield Static("Art-Net Discovery", id="question")
             with Horizontal(id="row2"):
                 yield Button("Discover", id="do_start", classes="small_button")
+                yield Button("Sweep", id="do_sweep", classes="small_button")
+                yield Button("Monitor", id="do_monitor", classes="small_button")
                 yield Button(
                     "Import Discovered",
                     id="import_to_kuma",
@@ -495,19 +584,66 @@ class ArtNetScreen(ModalScreen):
                 )
                 yield Button("Cancel", id="cancel", classes="small_button")
             yield Select([], id="networks_select")
+            yield Checkbox(
+                "Accumulate results of all discoveries",
+                value=self.app.discovery_accumulate_toggle,
+                id="accumulate_toggle",
+            )
+            yield Checkbox(
+                "Save discovered devices as MVR file",
+                value=self.app.discovery_export_toggle,
+                id="export_toggle",
+            )
+            yield Select(
+                [
+                    (f"Monitor every {interval} s", interval)
+                    for interval in MONITOR_INTERVALS
+                ],
+                value=self.app.discovery_monitor_interval
+                if self.app.discovery_monitor_interval in MONITOR_INTERVALS
+                else MONITOR_INTERVALS[2],
+                allow_blank=False,
+                id="interval_select",
+            )
+            yield Select(
+                [(label, chunk) for chunk, label in POLL_CHUNKS.items()],
+                value=self.app.discovery_poll_chunk
+                if self.app.discovery_poll_chunk in POLL_CHUNKS
+                else 0,
+                allow_blank=False,
+                id="chunk_select",
+            )
+            yield Input(
+                value=self.app.discovery_sweep_networks,
+                placeholder="Networks to sweep, like 10.0.0.0/16, 2.0.0.0/8, default: local networks",
+                id="sweep_networks",
+            )
+            yield Checkbox(
+                "Unicast sweep, poll every host of the networks",
+                value=self.app.discovery_unicast_toggle,
+                id="unicast_toggle",
+            )
             yield Static("", id="network")
             yield Static("", id="results")
+            yield DataTable(id="monitor_table", cursor_type="row")
 
     def on_mount(self):
-        select_widget = self.query_one("#networks_select", Select)
-        self.networks = get_network_cards()
-        if sys.platform.startswith("win"):
-            self.networks.pop(0)  # the 0.0.0.0 does not really work on Win
-
-        select_widget.set_options(self.networks)
-        if any(ip == "0.0.0.0" for name, ip in self.networks):
-            select_widget.value = "0.0.0.0"  # for Win
-        select_widget.refresh()  # Force redraw
+        # the interfaces are cached, this does not enumerate the adapters
+        self.set_networks()
+        interface_service.subscribe(self.interfaces_changed)
+
+        table = self.query_one("#monitor_table", DataTable)
+        for label, key in (
+            ("Name", "name"),
+            ("IP", "ip"),
+            ("Bind", "bind_index"),
+            ("Interface", "interface"),
+            ("Last seen", "last_seen"),
+            ("Latency", "latency"),
+            ("Status", "status"),
+            ("State", "state"),
+        ):
+            table.add_column(label, key=key)
 
         if self.app.singleline_ui_toggle:
             for button in self.query("Button"):
@@ -520,48 +656,269 @@ class ArtNetScreen(ModalScreen):
                 button.add_class("big_button")
                 button.refresh(layout=True)  # Force refresh if needed
 
+    def on_unmount(self):
+        interface_service.unsubscribe(self.interfaces_changed)
+
+    def interfaces_changed(self, interfaces):
+        """Called from the interface service thread."""
+        self.app.call_from_thread(self.networks_changed)
+
+    def networks_changed(self):
+        if self.is_mounted and self.is_attached:  # not closed meanwhile
+            self.set_networks()
+
+    def set_networks(self):
+        select_widget = self.query_one("#networks_select", Select)
+        self.networks = get_network_cards()
+        if sys.platform.startswith("win"):
+            self.networks.pop(0)  # the 0.0.0.0 does not really work on Win
+
+        select_widget.set_options(self.networks)
+        if any(ip == self.network for name, ip in self.networks):
+            select_widget.value = self.network  # keep the selection
+        elif self.network is not None:
+            # the interface is gone, do not bind to its address
+            gone = self.network
+            self.network = None
+            if self.monitoring:
+                self.stop_monitor()
+            self.query_one("#network").update(
+                f"[red]Interface {gone} is no longer available[/red]"
+            )
+            self.update_buttons()
+        elif any(ip == "0.0.0.0" for name, ip in self.networks):
+            select_widget.value = "0.0.0.0"  # for Win
+        select_widget.refresh()  # Force redraw
+
+    def update_buttons(self):
+        """Discover, Sweep and Monitor need a selected network."""
+        self.query_one("#do_start").disabled = self.monitoring or self.network is None
+        self.query_one("#do_sweep").disabled = self.monitoring or self.network is None
+        self.query_one("#do_monitor").disabled = (
+            not self.monitoring and self.network is None
+        )
+
+    def stop_monitor(self):
+        self.workers.cancel_group(self, "monitor")
+        self.monitoring = False
+        self.query_one("#do_monitor").label = "Monitor"
+        self.update_buttons()
+
     def on_button_pressed(self, event: Button.Pressed) -> None:
-        if event.button.id == "do_start":
-            self.run_discovery()
-            btn = self.query_one("#do_start")
-            btn.disabled = True
-            btn.label = "...discovering..."
+        if event.button.id in ("do_start", "do_sweep"):
+            self.run_discovery(sweep=event.button.id == "do_sweep")
+            self.query_one("#results").display = True
+            self.query_one("#monitor_table").display = False
+            self.query_one("#do_start").disabled = True
+            self.query_one("#do_sweep").disabled = True
+            event.button.label = "...discovering..."
+        if event.button.id == "do_monitor":
+            monitor_btn = self.query_one("#do_monitor")
+            if self.monitoring:
+                self.stop_monitor()
+            else:
+                self.monitoring = True
+                self.query_one("#results").display = False
+                self.query_one("#monitor_table").display = True
+                self.run_monitor()
+                monitor_btn.label = "Stop Monitor"
+                self.query_one("#do_start").disabled = True
+                self.query_one("#do_sweep").disabled = True
         if event.button.id == "import_to_kuma":
             self.dismiss()
-            self.app.run_import_mvr("./discovered_devices.mvr")
+            fixtures, tags = discovery_fixtures(self.devices)
+            self.app.post_message(MvrParsed(fixtures=fixtures, tags=tags))
         if event.button.id == "cancel":
             self.dismiss()
 
-    @on(Select.Changed)
+    @on(Select.Changed, "#networks_select")
     def select_changed(self, event: Select.Changed) -> None:
-        if str(event.value) and str(event.value) != "Select.BLANK":
+        if event.select.is_blank():
+            self.network = None
+        else:
             self.network = str(event.value)
             self.query_one("#network").update(f"{self.network}")
-            self.query_one("#do_start").disabled = False
+        self.update_buttons()
+
+    @on(Select.Changed, "#interval_select")
+    def interval_changed(self, event: Select.Changed) -> None:
+        self.app.discovery_monitor_interval = event.value
+
+    @on(Checkbox.Changed, "#accumulate_toggle")
+    def accumulate_changed(self, event: Checkbox.Changed) -> None:
+        self.app.discovery_accumulate_toggle = event.value
+
+    @on(Checkbox.Changed, "#export_toggle")
+    def export_changed(self, event: Checkbox.Changed) -> None:
+        self.app.discovery_export_toggle = event.value
+
+    @on(Select.Changed, "#chunk_select")
+    def chunk_changed(self, event: Select.Changed) -> None:
+        self.app.discovery_poll_chunk = event.value
+
+    @on(Checkbox.Changed, "#unicast_toggle")
+    def unicast_changed(self, event: Checkbox.Changed) -> None:
+        self.app.discovery_unicast_toggle = event.value
 
-    @work(thread=True)
-    async def run_discovery(self) -> str:
+    @on(Input.Changed, "#sweep_networks")
+    def sweep_networks_changed(self, event: Input.Changed) -> None:
+        self.app.discovery_sweep_networks = event.value
+
+    @work(exclusive=True, group="discovery")
+    async def run_discovery(self, sweep: bool = False) -> str:
         try:
             results_widget = self.query_one("#results", Static)
             results_widget.update("Searching...")
-            discovery = ArtNetDiscovery(bind_ip=self.network)
+            targets = None
+            if sweep:
+                text = self.app.discovery_sweep_networks
+                networks = (
+                    parse_networks(text) if text.strip() else interface_networks()
+                )
+                targets = sweep_targets(networks, self.app.discovery_unicast_toggle)
+                results_widget.update(
+                    f"Sweeping {', '.join(str(network) for network in networks)}..."
+                )
+            discovery = self.create_discovery()
             discovery.start()
-            result = discovery.discover_devices()
-            discovery.stop()  # not really needed, as the thread will close...
-            self.post_message(DevicesDiscovered(devices=result))
+            # runs on the app event loop, no thread is needed for waiting
+            result = await discovery.discover(
+                targets=targets, chunk=self.app.discovery_poll_chunk
+            )
+            discovery.stop()
+            self.post_message(DevicesDiscovered(devices=result, stats=discovery.stats))
         except Exception as e:
             self.post_message(DevicesDiscovered(error=str(e)))
 
-    def extract_uni_dmx(self, long_name):
-        address = None
-        universe = None
+    def create_discovery(self):
+        if self.network == EACH_INTERFACE:
+            return ArtNetDiscovery(interfaces=get_interfaces())
+        return ArtNetDiscovery(bind_ip=self.network)
+
+    @work(exclusive=True, group="monitor")
+    async def run_monitor(self) -> None:
+        """Poll at the configured interval, posting only the changes."""
+        monitor = ArtNetMonitor()
+        status = self.query_one("#network", Static)
+        while True:
+            interval = self.app.discovery_monitor_interval
+            started = time.monotonic()
+            try:
+                discovery = self.create_discovery()
+                discovery.start()
+                replies = await discovery.discover(timeout=min(interval, 1.5))
+                discovery.stop()
+            except Exception as e:
+                self.post_message(DevicesChanged(error=str(e)))
+            else:
+                delta = monitor.update(replies)
+                if delta.appeared or delta.gone or delta.changed or delta.seen:
+                    self.post_message(
+                        DevicesChanged(
+                            appeared=delta.appeared,
+                            gone=delta.gone,
+                            changed=delta.changed,
+                            seen=delta.seen,
+                        )
+                    )
+                status.update(
+                    f"{self.network} poll {monitor.polls}: "
+                    f"{monitor.online()} online, {len(monitor.devices)} known"
+                )
+            await asyncio.sleep(max(0, interval - (time.monotonic() - started)))
+
+    def monitor_seen(self, device):
+        return {
+            "last_seen": time.strftime("%H:%M:%S", time.localtime(device.last_seen)),
+            "latency": f"{device.latency * 1000:.0f} ms"
+            if device.latency is not None
+            else "",
+        }
+
+    def monitor_row(self, device):
+        status1, status2 = device.status[:2]
+        return {
+            "name": device.short_name,
+            "ip": device.ip_address,
+            "bind_index": device.bind_index,
+            "interface": device.interface or "",
+            **self.monitor_seen(device),
+            "status": f"{status1:02x} {status2:02x}",
+            "state": "online" if device.online else "[red]gone[/red]",
+        }
+
+    def on_devices_changed(self, message: DevicesChanged) -> None:
+        if message.error:
+            self.query_one("#network", Static).update(
+                f"[red]Monitoring error:[/red] {message.error}"
+            )
+            return
+        table = self.query_one("#monitor_table", DataTable)
+        # only the rows of changed devices are rewritten
+        rewritten = set()
+        for device in message.appeared + message.changed + message.gone:
+            row_key = f"{device.key[0]}/{device.key[1]}"
+            rewritten.add(row_key)
+            row = self.monitor_row(device)
+            if row_key in table.rows:
+                for column_key, value in row.items():
+                    table.update_cell(row_key, column_key, value)
+            else:
+                table.add_row(*row.values(), key=row_key)
+        # steady devices, only their last seen time and latency move
+        for device in message.seen:
+            row_key = f"{device.key[0]}/{device.key[1]}"
+            if row_key in rewritten or row_key not in table.rows:
+                continue
+            for column_key, value in self.monitor_seen(device).items():
+                table.update_cell(row_key, column_key, value)
+
+    @work(thread=True, exclusive=True, group="export_mvr")
+    async def run_export_mvr(self, devices) -> str:
+        try:
+            output_path = create_mvr(devices)
+            self.post_message(MvrExported(path=str(output_path)))
+        except Exception as e:
+            self.post_message(MvrExported(error=str(e)))
+
+    def on_mvr_exported(self, message: MvrExported) -> None:
+        if message.error:
+            saved = f"[red]MVR file not saved:[/red] {message.error}"
+        else:
+            saved = f"[green]MVR file saved as `{message.path}`[/green]"
+        self.query_one("#results", Static).update(f"{saved}\n{self.result}")
+
+    def extract_dmx_address(self, long_name):
+        """DMX start address, which ArtPollReply does not carry.
+
+        Some vendors put "DMX: n Universe: m" into the long name.
+        """
         match = None
         if long_name is not None:
             match = re.search(r"DMX:\s*(\d+)\s*Universe:\s*(\d+)", long_name)
         if match:
-            address = match.group(1)
-            universe = match.group(2)
-        return universe, address
+            return match.group(1)
+        return None
+
+    def device_universe(self, device):
+        """MVR universe of the first output port, or input port.
+
+        Art-Net Port-Addresses start at 0, MVR universes at 1.
+        """
+        ports = device.get("outputs") or device.get("inputs")
+        if ports:
+            return ports[0] + 1
+        return None
+
+    def stats_text(self, stats):
+        if stats is None:
+            return ""
+        dropped = "unknown" if stats.dropped is None else stats.dropped
+        return (
+            f"{stats.polls} poll(s), {stats.received} received, "
+            f"{stats.parsed} parsed, {stats.duplicate} duplicate, "
+            f"{dropped} dropped by the system\n"
+        )
 
     def on_devices_discovered(self, message: DevicesDiscovered) -> None:
         devices = []
@@ -569,35 +926,55 @@ class ArtNetScreen(ModalScreen):
         if message.devices:
             for device in message.devices:
                 short_name = device.get("short_name", "No Name")
-                universe, address = self.extract_uni_dmx(device.get("long_name", ""))
                 ip_address = device.get("source_ip", None)
                 devices.append(
                     SimpleNamespace(
                         ip_address=ip_address,
                         short_name=short_name,
-                        universe=universe,
-                        address=address,
+                        universe=self.device_universe(device),
+                        address=self.extract_dmx_address(device.get("long_name")),
+                        mac=device.get("mac"),
+                        bind_index=device.get("bind_index", 1),
+                        interface=device.get("interface"),
                     )
                 )
             result = "\n".join(
                 f"{item.short_name} {item.ip_address} {item.universe or ''} {item.address or ''}"
+                + (f" [{item.interface}]" if item.interface else "")
                 for item in devices
             )
 
-        if devices:
-            create_mvr(devices)
-            result = f"[green]MVR with {len(devices)} result(s) saved as `discovered_devices.mvr`[/green]\n\n{result}"
-
-            btn = self.query_one("#import_to_kuma")
-            btn.disabled = False
+        export = True
+        if devices and self.app.discovery_accumulate_toggle:
+            store = DiscoveryStore()
+            added, changed = store.update(devices)
+            store.save()
+            found = len(devices)
+            devices = store.list()
+            # rewrite the MVR file only when the device set has changed
+            export = added or changed or not Path(DISCOVERED_MVR).exists()
+            summary = (
+                f"{found} device(s) found, {added} new, {changed} changed, "
+                f"{len(devices)} known"
+            )
+        elif devices:
+            summary = f"{len(devices)} device(s) found"
 
+        if devices:
+            self.devices = devices
+            self.query_one("#import_to_kuma").disabled = False
+            if self.app.discovery_export_toggle and export:
+                self.run_export_mvr(devices)
+            self.result = (
+                f"[green]{summary}[/green]\n{self.stats_text(message.stats)}\n{result}"
+            )
         else:
-            result = f"[red]No devices found {message.error}[/red]"
+            self.result = f"[red]No devices found {message.error}[/red]"
 
-        results_widget.update(result)
-        btn = self.query_one("#do_start")
-        btn.disabled = False
-        btn.label = "Discover"
+        results_widget.update(self.result)
+        self.query_one("#do_start").label = "Discover"
+        self.query_one("#do_sweep").label = "Sweep"
+        self.update_buttons()
 
     def action_focus_next(self) -> None:
         self.focus_next()
@@ -0,0 +1,90 @@
+# Copyright (C) 2025 vanous
+#
+# This file is part of MVRtoKuma.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from types import SimpleNamespace
+
+# ChildList members, other than fixtures, which can carry a network address
+NETWORK_OBJECTS = (
+    "scene_objects",
+    "trusses",
+    "supports",
+    "video_screens",
+    "projectors",
+)
+
+# XML tags of the above, used by the streaming reader
+NETWORK_OBJECT_TAGS = ("SceneObject", "Truss", "Support", "VideoScreen", "Projector")
+
+
+def walk_scene(scene):
+    """Collect fixtures and network addressable objects of a pymvr Scene.
+
+    Walks all layers once, iteratively, so deeply nested groups cannot hit
+    the recursion limit. Returns a namespace with:
+        layers: list of SimpleNamespace(layer=pymvr.Layer, fixtures=[...])
+        fixtures: all collected objects in scene order
+        classes, positions: uuid -> pymvr Class/Position used by the objects
+    """
+    result = SimpleNamespace(layers=[], fixtures=[], classes={}, positions={})
+    if scene is None:
+        return result
+
+    mvr_classes = {}
+    mvr_positions = {}
+    if scene.aux_data is not None:
+        mvr_classes = {class_.uuid: class_ for class_ in scene.aux_data.classes}
+        mvr_positions = {
+            position.uuid: position for position in scene.aux_data.positions
+        }
+
+    for layer in scene.layers:
+        if layer.child_list is None:
+            continue
+        layer_fixtures = []
+        stack = [layer.child_list]
+        while stack:
+            child_list = stack.pop()
+            nested = []
+            objects = list(child_list.fixtures)
+            for attribute in NETWORK_OBJECTS:
+                for mvr_object in getattr(child_list, attribute):
+                    if mvr_object.addresses.network:
+                        objects.append(mvr_object)
+                    elif mvr_object.child_list is not None:
+                        nested.append(mvr_object.child_list)
+
+            for mvr_object in objects:
+                layer_fixtures.append(mvr_object)
+                class_ = mvr_classes.get(mvr_object.classing)
+                if class_ is not None and class_.name:
+                    result.classes.setdefault(class_.uuid, class_)
+                position = mvr_positions.get(getattr(mvr_object, "position", None))
+                if position is not None and position.name:
+                    result.positions.setdefault(position.uuid, position)
+                if mvr_object.child_list is not None:
+                    nested.append(mvr_object.child_list)
+
+            for group in child_list.group_objects:
+                if group.child_list is not None:
+                    nested.append(group.child_list)
+            # reversed, so that the nested lists are popped in scene order
+            stack.extend(reversed(nested))
+
+        result.layers.append(SimpleNamespace(layer=layer, fixtures=layer_fixtures))
+        result.fixtures.extend(layer_fixtures)
+
+    return result
@@ -0,0 +1,182 @@
+# Copyright (C) 2025 vanous
+#
+# This file is part of MVRtoKuma.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from types import SimpleNamespace
+from pathlib import Path
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+def file_state(path):
+    """(mtime, size) of path, None if it cannot be read."""
+    try:
+        stat = os.stat(path)
+        return (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        return None
+
+
+def _load_inotify():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        return SimpleNamespace(
+            init=libc.inotify_init1, add_watch=libc.inotify_add_watch
+        )
+    except (OSError, AttributeError):
+        return None
+
+
+class FileWatcher:
+    """Wait for changes of a file, via inotify on Linux, polling elsewhere.
+
+    The parent directory is watched, as exporters often write a temporary
+    file and rename it over the original. When given a Textual worker, waiting
+    for the file to settle stops once the worker is cancelled. last_stat is
+    the file_state() of the version already read, a newer file is a change.
+    """
+
+    def __init__(
+        self,
+        file_path,
+        interval: float = 1.0,
+        settle: float = 0.5,
+        worker=None,
+        last_stat=None,
+    ):
+        self.path = Path(file_path).resolve()
+        self.interval = interval
+        self.settle = settle
+        self.worker = worker
+        self.fd = None
+        self.last_stat = last_stat or self._stat()
+        inotify = _load_inotify()
+        if inotify is not None:
+            fd = inotify.init(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+                if inotify.add_watch(fd, str(self.path.parent).encode(), mask) < 0:
+                    os.close(fd)
+                else:
+                    self.fd = fd
+        # changed after last_stat was taken, before inotify was watching
+        self.missed = self._stat() != self.last_stat
+
+    @property
+    def uses_inotify(self):
+        return self.fd is not None
+
+    def _stat(self):
+        return file_state(self.path)
+
+    def _inotify_event(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+        offset = 0
+        touched = False
+        while offset + INOTIFY_EVENT.size <= len(data):
+            _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset : offset + length].rstrip(b"\x00")
+            offset += length
+            if name == self.path.name.encode():
+                touched = True
+        return touched
+
+    def wait(self, timeout: float = 1.0):
+        """Block up to timeout seconds, True if the file has changed."""
+        if self.missed:
+            self.missed = False
+        elif self.uses_inotify:
+            if not self._inotify_event(timeout):
+                return False
+        else:
+            time.sleep(min(timeout, self.interval))
+
+        current = self._stat()
+        if current is None or current == self.last_stat:
+            return False
+        # let the exporter finish writing
+        while True:
+            if self.worker is not None and self.worker.is_cancelled:
+                return False
+            time.sleep(self.settle)
+            settled = self._stat()
+            if settled == current:
+                break
+            current = settled
+        self.last_stat = current
+        return current is not None
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def _fixture_state(row):
+    return (
+        row.name,
+        row.ipv4,
+        row.classing,
+        row.position,
+        row.layer.uuid if row.layer else None,
+    )
+
+
+def fixture_delta(old_table, new_table, uuids=None):
+    """Compare two FixtureTables by fixture uuid.
+
+    Returns added, removed and changed lists of FixtureRows, changed holds
+    the new version of the fixture. With uuids, only those fixtures of
+    old_table can be removed, the rest of old_table came from elsewhere.
+    """
+    delta = SimpleNamespace(added=[], removed=[], changed=[])
+    for row in new_table.rows():
+        old_row = old_table.get(row.uuid)
+        if old_row is None:
+            delta.added.append(row)
+        elif _fixture_state(old_row) != _fixture_state(row):
+            delta.changed.append(row)
+    old_rows = (
+        old_table.rows()
+        if uuids is None
+        else (old_table.get(uuid) for uuid in uuids if uuid in old_table)
+    )
+    for row in old_rows:
+        if row.uuid not in new_table:
+            delta.removed.append(row)
+    return delta